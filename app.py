@@ -5,10 +5,40 @@ Provides a WebSocket interface for real-time command processing and image handli
 
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import json
 import base64
-from typing import Dict, Optional
+import os
+import sys
+from typing import Any, Dict, Optional
 from crew import LlmBot
+from llm_bot.cassette import CassetteMiss, cassette_session, new_request_id, record_result
+from llm_bot.deadline import Deadline, DeadlineExceeded, deadline_scope
+from llm_bot.incremental import SUBPROTOCOL, IncrementalParser
+from llm_bot.log_config import configure_logging, fields, get_logger, request_context
+from llm_bot.memory import (
+    RECYCLE_EXIT_CODE,
+    CrewPool,
+    get_recycler,
+    memory_accounting,
+    memory_settings,
+    memory_stats,
+    should_supervise,
+    supervise
+)
+from llm_bot.repair import repair_stats
+from llm_bot.tools.vision_backend import frame_scope, split_frame
+
+logger = get_logger('websocket')
+configure_logging()
+recycler = get_recycler()
+
+# crewai keeps per-request state on a crew, so each concurrent request checks one out of the pool;
+# requests running together can then share vision batches
+crew_pool = CrewPool(lambda: LlmBot().crew(), memory_settings()['crew_pool_size'])
+
+# Set when run as a script, so a recycled worker can stop uvicorn after its last reply
+server: Optional[Any] = None
 
 # Initialize FastAPI app
 app = FastAPI()
@@ -22,6 +52,85 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def decode_image(image_base64: str) -> bytes:
+    """Decode a base64 image, with or without a data URL prefix."""
+    # Remove data URL prefix if present
+    if ',' in image_base64:
+        image_base64 = image_base64.split(',')[1]
+    return base64.b64decode(image_base64)
+
+def finish_request() -> None:
+    """Count a finished request and shut down gracefully once this worker should be recycled."""
+    if recycler.request_finished() and server is not None:
+        server.should_exit = True
+
+def process_command(inputs: Dict, deadline: Deadline) -> Dict:
+    """
+    Run a pooled crew for a single request within its deadline.
+    
+    Memory accounting covers returning the crew to the pool, which resets it, so what the request
+    retains excludes its crew state.
+    
+    Args:
+        inputs (Dict): Crew inputs (user_command and optional image bytes)
+        deadline (Deadline): Request deadline
+    
+    Returns:
+        Dict: Response payload containing status and result/error
+    """
+    with memory_accounting():
+        try:
+            with crew_pool.crew() as crew:
+                return run_crew(crew, inputs, deadline)
+        except Exception as e:
+            # The crew could not be built
+            return {
+                'status': 'error',
+                'error': str(e)
+            }
+
+def run_crew(crew: Any, inputs: Dict, deadline: Deadline) -> Dict:
+    """
+    Run a crew for a single request within its deadline.
+    
+    Args:
+        crew: Crew checked out of the pool
+        inputs (Dict): Crew inputs (user_command and optional image bytes)
+        deadline (Deadline): Request deadline
+    
+    Returns:
+        Dict: Response payload containing status and result/error
+    """
+    try:
+        # Bounded by the request deadline
+        crew_inputs, image = split_frame(inputs)
+        with deadline_scope(deadline), frame_scope(image):
+            result = crew.kickoff(inputs=crew_inputs)
+        
+        # Convert result to JSON
+        if hasattr(result, 'model_dump_json'):
+            result_json = json.loads(result.model_dump_json())
+        else:
+            result_json = result.dict() if hasattr(result, 'dict') else result
+        
+        return {
+            'status': 'success',
+            'result': result_json,
+            'degraded': deadline.degraded
+        }
+        
+    except DeadlineExceeded as e:
+        return {
+            'status': 'timeout',
+            'error': str(e),
+            'degraded': e.degraded
+        }
+    except Exception as e:
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """
@@ -35,6 +144,11 @@ async def websocket_endpoint(websocket: WebSocket):
     Args:
         websocket (WebSocket): WebSocket connection instance
     """
+    if SUBPROTOCOL in websocket.scope.get('subprotocols', []):
+        await websocket.accept(subprotocol=SUBPROTOCOL)
+        await incremental_session(websocket)
+        return
+    
     await websocket.accept()
     
     try:
@@ -46,6 +160,15 @@ async def websocket_endpoint(websocket: WebSocket):
             user_command = data.get('user_command', '')
             image_base64 = data.get('image', None)
             
+            try:
+                deadline = Deadline.from_request(data)
+            except ValueError as e:
+                await websocket.send_json({
+                    'status': 'error',
+                    'error': str(e)
+                })
+                continue
+            
             # Process the command using LlmBot
             inputs = {
                 'user_command': user_command
@@ -54,48 +177,166 @@ async def websocket_endpoint(websocket: WebSocket):
             # If image is present, decode it and add to inputs
             if image_base64:
                 try:
-                    # Remove data URL prefix if present
-                    if ',' in image_base64:
-                        image_base64 = image_base64.split(',')[1]
-                    image_bytes = base64.b64decode(image_base64)
-                    inputs['image'] = image_bytes
+                    inputs['image'] = decode_image(image_base64)
                 except Exception as e:
                     await websocket.send_json({
                         'error': f'Invalid image data: {str(e)}'
                     })
                     continue
             
+            request_id = new_request_id(data)
             try:
-                # Create crew instance and process command
-                crew = LlmBot().crew()
-                result = crew.kickoff(inputs=inputs)
-                
-                # Convert result to JSON
-                if hasattr(result, 'model_dump_json'):
-                    result_json = json.loads(result.model_dump_json())
-                else:
-                    result_json = result.dict() if hasattr(result, 'dict') else result
-                
-                # Send response back to client
-                await websocket.send_json({
-                    'status': 'success',
-                    'result': result_json
-                })
-                
-            except Exception as e:
-                await websocket.send_json({
+                with request_context(request_id), cassette_session(request_id, inputs):
+                    logger.info("Received request", extra=fields(user_command=user_command[:50]))
+                    # In a worker thread, so waiting for a free crew does not block other connections
+                    response = await asyncio.to_thread(process_command, inputs, deadline)
+                    record_result(response)
+                    
+            except CassetteMiss as e:
+                response = {
                     'status': 'error',
                     'error': str(e)
+                }
+            
+            # Send response back to client
+            response['request_id'] = request_id
+            await websocket.send_json(response)
+            finish_request()
+                
+    except Exception as e:
+        await websocket.close(code=1001, reason=str(e))
+
+async def incremental_session(websocket: WebSocket):
+    """
+    Incremental command text sub-protocol (`llm-bot.incremental.v1`).
+    
+    The connection keeps the parse state of the current utterance. Motion clauses are confirmed
+    once the first word of the clause after them shows they are neither continued nor corrected, or
+    at end-of-utterance; the remaining clauses go to the crew at end-of-utterance.
+    
+    Client messages:
+    - {"type": "text", "text": "..."}: next piece of the utterance, whitespace included
+    - {"type": "end", "image"?, "deadline_ms"?, "request_id"?}: end of the utterance
+    - {"type": "reset"}: discard the current utterance
+    
+    Server messages:
+    - {"type": "confirmed", "index", "clause", "response"}: a motion clause parsed locally
+    - {"type": "final", "status", "result", ...}: the full response in spoken order
+    
+    Args:
+        websocket (WebSocket): Accepted WebSocket connection
+    """
+    parser = IncrementalParser()
+    try:
+        while True:
+            data = await websocket.receive_json()
+            message_type = data.get('type')
+            
+            if message_type == 'text':
+                completed = parser.feed(data.get('text', ''))
+            elif message_type == 'end':
+                completed = parser.finish()
+            elif message_type == 'reset':
+                parser = IncrementalParser()
+                continue
+            else:
+                await websocket.send_json({
+                    'type': 'error',
+                    'error': f'Unknown message type: {message_type!r}'
                 })
+                continue
+            
+            for clause in completed:
+                if clause.response is not None:
+                    await websocket.send_json(clause.to_message())
+            
+            if message_type == 'end':
+                response = await finish_utterance(parser, data)
+                response['type'] = 'final'
+                await websocket.send_json(response)
+                parser = IncrementalParser()
+                finish_request()
                 
     except Exception as e:
         await websocket.close(code=1001, reason=str(e))
 
+async def finish_utterance(parser: IncrementalParser, data: Dict) -> Dict:
+    """
+    Answer the pending clauses of a finished utterance and merge them with the confirmed ones.
+    
+    The crew runs in a worker thread so other connections keep streaming meanwhile, and is
+    skipped entirely when every clause was confirmed locally.
+    
+    Args:
+        parser (IncrementalParser): Parse state of the finished utterance
+        data (Dict): The "end" message
+    
+    Returns:
+        Dict: Response payload containing status and result/error
+    """
+    try:
+        deadline = Deadline.from_request(data)
+        inputs = {'user_command': parser.pending_command()}
+        if data.get('image'):
+            inputs['image'] = decode_image(data['image'])
+    except ValueError as e:
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+    
+    request_id = new_request_id(data)
+    try:
+        with request_context(request_id), cassette_session(request_id, inputs):
+            logger.info("Received utterance", extra=fields(
+                user_command=parser.text[:50],
+                confirmed=len(parser.confirmed()),
+                crew_clauses=len(parser.pending())
+            ))
+            if inputs['user_command']:
+                response = await asyncio.to_thread(process_command, inputs, deadline)
+            else:
+                response = {
+                    'status': 'success',
+                    'result': parser.local_result(),
+                    'degraded': []
+                }
+            record_result(response)
+            
+    except CassetteMiss as e:
+        response = {
+            'status': 'error',
+            'error': str(e)
+        }
+    
+    if response['status'] == 'success' and inputs['user_command']:
+        result = response['result'] if isinstance(response['result'], dict) else {}
+        response['result'] = dict(result, responses=parser.merge(result.get('responses') or []))
+    response.update({
+        'request_id': request_id,
+        'confirmed': len(parser.confirmed()),
+        'crew_clauses': len(parser.pending())
+    })
+    return response
+
 @app.get("/")
 async def root():
     """Root endpoint to verify server status."""
     return {"message": "LLM Bot WebSocket Server"}
 
+@app.get("/stats")
+async def stats():
+    """Report how many LLM retries the local schema repair has avoided, and memory usage."""
+    return {
+        "repair": repair_stats.snapshot(),
+        "memory": dict(memory_stats.snapshot(), served=recycler.served, crews=crew_pool.created)
+    }
+
 if __name__ == "__main__":
+    if should_supervise():
+        sys.exit(supervise([os.path.abspath(__file__)] + sys.argv[1:]))
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    server = uvicorn.Server(uvicorn.Config(app, host="0.0.0.0", port=8000))
+    server.run()
+    # Exit with the recycle status so the supervisor starts a fresh worker
+    sys.exit(RECYCLE_EXIT_CODE if recycler.reason else 0)
\ No newline at end of file
@@ -6,10 +6,25 @@ Provides a ZeroMQ-based interface for processing commands and handling image dat
 import zmq
 import json
 import base64
+import os
 import signal
 import sys
 from typing import Dict, Optional
 from crew import LlmBot
+from llm_bot.cassette import cassette_session, new_request_id, record_result
+from llm_bot.deadline import Deadline, DeadlineExceeded, deadline_scope
+from llm_bot.log_config import configure_logging, fields, get_logger, request_context
+from llm_bot.memory import (
+    RECYCLE_EXIT_CODE,
+    get_recycler,
+    memory_accounting,
+    reset_crew_state,
+    should_supervise,
+    supervise
+)
+from llm_bot.tools.vision_backend import frame_scope, get_vision_batcher, split_frame
+
+logger = get_logger('zmq')
 
 class LLMBotServer:
     """
@@ -21,6 +36,7 @@ class LLMBotServer:
         socket (zmq.Socket): ZMQ REP socket
         running (bool): Server running state
         crew (LlmBot): LLM Bot crew instance
+        recycler (WorkerRecycler): Decides when this worker should be replaced
     """
     
     def __init__(self, port: int = 5555):
@@ -34,10 +50,16 @@ class LLMBotServer:
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.REP)
         self.running = True
+        configure_logging()
         
         # Initialize crew instance once during startup
-        print("Initializing LLM Bot crew...")
+        logger.info("Initializing LLM Bot crew")
         self.crew = LlmBot().crew()
+        self.recycler = get_recycler()
+        
+        # The REP socket serves one request at a time, so no other request can join a vision batch
+        # and waiting for one would only add latency; a request's own queries still share a batch
+        get_vision_batcher().window_ms = 0
         
         # Setup signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -45,7 +67,7 @@ class LLMBotServer:
 
     def signal_handler(self, signum, frame):
         """Handle shutdown signals gracefully"""
-        print("\nShutting down server...")
+        logger.info("Shutting down server")
         self.running = False
         self.socket.close()
         self.context.term()
@@ -56,7 +78,8 @@ class LLMBotServer:
         Process incoming request and return response.
         
         Args:
-            data (Dict): Request data containing user_command and optional image
+            data (Dict): Request data containing user_command, optional image,
+                optional deadline_ms and optional request_id
         
         Returns:
             Dict: Response containing status and result/error
@@ -65,6 +88,7 @@ class LLMBotServer:
             # Extract user command and image if present
             user_command = data.get('user_command', '')
             image_base64 = data.get('image', None)
+            deadline = Deadline.from_request(data)
             
             inputs = {
                 'user_command': user_command
@@ -84,8 +108,37 @@ class LLMBotServer:
                         'error': f'Invalid image data: {str(e)}'
                     }
             
-            # Use the existing crew instance
-            result = self.crew.kickoff(inputs=inputs)
+            request_id = new_request_id(data)
+            with request_context(request_id), cassette_session(request_id, inputs):
+                logger.info("Received request", extra=fields(user_command=user_command[:50]))
+                with memory_accounting():
+                    response = self.run_crew(inputs, deadline)
+                record_result(response)
+            response['request_id'] = request_id
+            return response
+            
+        except Exception as e:
+            return {
+                'status': 'error',
+                'error': str(e)
+            }
+
+    def run_crew(self, inputs: Dict, deadline: Deadline) -> Dict:
+        """
+        Run the shared crew for a single request within its deadline.
+        
+        Args:
+            inputs (Dict): Crew inputs (user_command and optional image bytes)
+            deadline (Deadline): Request deadline
+        
+        Returns:
+            Dict: Response containing status and result/error
+        """
+        try:
+            # Use the existing crew instance, bounded by the request deadline
+            crew_inputs, image = split_frame(inputs)
+            with deadline_scope(deadline), frame_scope(image):
+                result = self.crew.kickoff(inputs=crew_inputs)
             
             # Convert result to JSON-serializable format
             if hasattr(result, 'model_dump_json'):
@@ -95,14 +148,24 @@ class LLMBotServer:
             
             return {
                 'status': 'success',
-                'result': result_json
+                'result': result_json,
+                'degraded': deadline.degraded
             }
             
+        except DeadlineExceeded as e:
+            return {
+                'status': 'timeout',
+                'error': str(e),
+                'degraded': e.degraded
+            }
         except Exception as e:
             return {
                 'status': 'error',
                 'error': str(e)
             }
+        finally:
+            # The crew is reused, so drop this request's outputs, tool results and caches
+            reset_crew_state(self.crew)
 
     def run(self):
         """
@@ -113,13 +176,12 @@ class LLMBotServer:
         """
         try:
             self.socket.bind(f"tcp://*:{self.port}")
-            print(f"Server started on port {self.port}")
+            logger.info(f"Server started on port {self.port}")
             
             while self.running:
                 try:
                     # Wait for next request from client
                     message = self.socket.recv_json()
-                    print(f"Received request: {message.get('user_command', '')[:50]}...")
                     
                     # Process the request
                     response = self.process_request(message)
@@ -127,9 +189,13 @@ class LLMBotServer:
                     # Send reply back to client
                     self.socket.send_json(response)
                     
+                    # Stop after the reply so the supervisor can start a fresh worker
+                    if self.recycler.request_finished():
+                        self.running = False
+                    
                 except zmq.ZMQError as e:
                     if self.running:  # Only log error if we're still meant to be running
-                        print(f"ZMQ Error: {e}")
+                        logger.error(f"ZMQ Error: {e}")
                 except json.JSONDecodeError:
                     error_response = {
                         'status': 'error',
@@ -148,5 +214,10 @@ class LLMBotServer:
             self.context.term()
 
 if __name__ == "__main__":
+    if should_supervise():
+        configure_logging()
+        sys.exit(supervise([os.path.abspath(__file__)] + sys.argv[1:]))
     server = LLMBotServer()
-    server.run()
\ No newline at end of file
+    server.run()
+    # Exit with the recycle status so the supervisor starts a fresh worker
+    sys.exit(RECYCLE_EXIT_CODE if server.recycler.reason else 0)
\ No newline at end of file
@@ -0,0 +1,368 @@
+"""
+Record/replay cassettes for the LLM Bot.
+In record mode every LLM call and tool call made for a request is appended to a cassette file;
+in replay mode the LLM and tools are served from the cassette so production traffic can be
+reproduced offline, deterministically, with its original or zero latency.
+
+Cassette layout:
+    <path>       append-only JSON lines, one record per request/LLM call/tool call/result
+    <path>.idx   JSON lines index of [request_id, offset, length] for every record
+"""
+import base64
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from llm_bot.settings import get_section
+
+MODES = ("off", "record", "replay")
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when a call has no matching recording."""
+
+class Cassette:
+    """
+    Append-only cassette file with a byte-offset index.
+
+    Attributes:
+        path (str): Path of the data file
+        index_path (str): Path of the index file
+    """
+
+    def __init__(self, path: str):
+        """
+        Open a cassette, creating its directory if needed.
+
+        Args:
+            path (str): Path of the data file
+        """
+        self.path = path
+        self.index_path = path + '.idx'
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, List[List[int]]]] = None
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """
+        Append a record and its index entry.
+
+        Args:
+            record (Dict): Record with at least `kind` and `request_id`
+        """
+        line = (json.dumps(record, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+        with self._lock:
+            with open(self.path, 'ab') as data_file:
+                offset = data_file.tell()
+                data_file.write(line)
+            with open(self.index_path, 'a') as index_file:
+                # JSON-encoded, so a client-supplied ID cannot break the line format
+                index_file.write(json.dumps([record['request_id'], offset, len(line)]) + '\n')
+            if self._index is not None:
+                self._index.setdefault(record['request_id'], []).append([offset, len(line)])
+
+    def _load_index(self) -> Dict[str, List[List[int]]]:
+        if self._index is not None:
+            return self._index
+        index: Dict[str, List[List[int]]] = {}
+        try:
+            with open(self.index_path, 'r') as index_file:
+                for entry in index_file:
+                    request_id, offset, length = json.loads(entry)
+                    index.setdefault(request_id, []).append([int(offset), int(length)])
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError):
+            # An unreadable index (e.g. the older tab-separated format) is rebuilt from the data file
+            index = {}
+        if not index and os.path.exists(self.path):
+            # Rebuild a missing or unreadable index by scanning the data file once
+            with open(self.path, 'rb') as data_file:
+                offset = 0
+                for line in data_file:
+                    record = json.loads(line)
+                    index.setdefault(record['request_id'], []).append([offset, len(line)])
+                    offset += len(line)
+        self._index = index
+        return index
+
+    def request_ids(self) -> List[str]:
+        """Return the recorded request IDs in recording order."""
+        with self._lock:
+            return list(self._load_index().keys())
+
+    def load_request(self, request_id: str) -> List[Dict[str, Any]]:
+        """
+        Read every record of one request using the index.
+
+        Args:
+            request_id (str): Recorded request ID
+
+        Returns:
+            List[Dict]: Records in the order they were appended
+        """
+        with self._lock:
+            entries = list(self._load_index().get(request_id, []))
+        records = []
+        with open(self.path, 'rb') as data_file:
+            for offset, length in entries:
+                data_file.seek(offset)
+                records.append(json.loads(data_file.read(length)))
+        return records
+
+class CassetteSession:
+    """
+    Recording or replay state of a single request.
+
+    Attributes:
+        request_id (str): ID shared by all records of the request
+        mode (str): "record" or "replay"
+        zero_latency (bool): Serve replayed calls immediately instead of with their recorded latency
+        strict (bool): Raise on an LLM call that matches no recording instead of serving the next one
+    """
+
+    def __init__(self, cassette: Cassette, request_id: str, mode: str,
+                 zero_latency: bool = False, strict: bool = False):
+        self.cassette = cassette
+        self.request_id = request_id
+        self.mode = mode
+        self.zero_latency = zero_latency
+        self.strict = strict
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._pending: Dict[str, List[Dict[str, Any]]] = {'llm': [], 'tool': []}
+        if mode == 'replay':
+            for record in cassette.load_request(request_id):
+                if record['kind'] in self._pending:
+                    self._pending[record['kind']].append(record)
+            if not any(self._pending.values()):
+                raise CassetteMiss(f"Request {request_id} is not in cassette {cassette.path}")
+
+    def _next_seq(self) -> int:
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+    def record(self, kind: str, **fields: Any) -> None:
+        """Append a record for this request (record mode only)."""
+        if self.mode != 'record':
+            return
+        self.cassette.append(dict(kind=kind, request_id=self.request_id, seq=self._next_seq(), **fields))
+
+    def take(self, kind: str, key: str) -> Dict[str, Any]:
+        """
+        Take the recorded interaction matching `key`, sleeping for its recorded latency.
+
+        Falls back to the next unused recording of the same kind unless the session is strict.
+
+        Raises:
+            CassetteMiss: If nothing suitable is left
+        """
+        with self._lock:
+            pending = self._pending[kind]
+            match = next((record for record in pending if record['key'] == key), None)
+            if match is None and pending and not self.strict:
+                match = pending[0]
+            if match is None:
+                raise CassetteMiss(f"No recorded {kind} call left for request {self.request_id}")
+            pending.remove(match)
+        if not self.zero_latency:
+            time.sleep(match.get('latency_ms', 0) / 1000.0)
+        return match
+
+_current_session: ContextVar[Optional[CassetteSession]] = ContextVar('llm_bot_cassette', default=None)
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+def cassette_settings() -> Dict[str, Any]:
+    """
+    Resolve the cassette settings from runtime.yaml and the environment.
+
+    LLM_BOT_CASSETTE_MODE, LLM_BOT_CASSETTE_PATH and LLM_BOT_CASSETTE_LATENCY override the file.
+    """
+    config = get_section('cassette')
+    mode = os.environ.get('LLM_BOT_CASSETTE_MODE', config.get('mode') or 'off')
+    if mode not in MODES:
+        raise ValueError(f"Invalid cassette mode: {mode!r}")
+    return {
+        'mode': mode,
+        'path': os.environ.get('LLM_BOT_CASSETTE_PATH', config.get('path', 'cassettes/llm_bot.cassette')),
+        'replay_latency': os.environ.get('LLM_BOT_CASSETTE_LATENCY', config.get('replay_latency', 'original')),
+        'strict': bool(config.get('strict', False))
+    }
+
+def get_cassette(path: str) -> Cassette:
+    """Return the process-wide Cassette for a path."""
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+def current_session() -> Optional[CassetteSession]:
+    """Return the cassette session of the request being processed, if any."""
+    return _current_session.get()
+
+def new_request_id(data: Dict[str, Any]) -> str:
+    """Use the client-supplied request_id, or generate one."""
+    return str(data.get('request_id') or uuid.uuid4().hex)
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray)):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    return value
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if set(value) == {'__bytes__'}:
+            return base64.b64decode(value['__bytes__'])
+        return {key: _decode(item) for key, item in value.items()}
+    return value
+
+def _key(payload: Any) -> str:
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+@contextmanager
+def cassette_session(request_id: str, inputs: Dict[str, Any],
+                     settings: Optional[Dict[str, Any]] = None) -> Iterator[Optional[CassetteSession]]:
+    """
+    Record or replay the enclosed request according to the cassette settings.
+
+    Yields None when cassettes are off.
+
+    Args:
+        request_id (str): Request ID the records are stored under
+        inputs (Dict): Crew inputs, stored so the request can be re-run offline
+        settings (Dict, optional): Overrides cassette_settings()
+    """
+    settings = settings or cassette_settings()
+    if settings['mode'] == 'off':
+        yield None
+        return
+
+    session = CassetteSession(
+        get_cassette(settings['path']),
+        request_id,
+        settings['mode'],
+        zero_latency=settings['replay_latency'] == 'zero',
+        strict=settings['strict']
+    )
+    session.record('request', inputs=_encode(inputs), ts=time.time())
+    token = _current_session.set(session)
+    try:
+        yield session
+    finally:
+        _current_session.reset(token)
+
+def record_result(response: Dict[str, Any]) -> None:
+    """Store the final server response of the current request."""
+    session = current_session()
+    if session is not None:
+        session.record('result', response=response,
+                       latency_ms=(time.monotonic() - session.started_at) * 1000.0)
+
+def load_inputs(cassette: Cassette, request_id: str) -> Dict[str, Any]:
+    """Return the crew inputs recorded for a request."""
+    for record in cassette.load_request(request_id):
+        if record['kind'] == 'request':
+            return _decode(record['inputs'])
+    raise CassetteMiss(f"Request {request_id} has no recorded inputs")
+
+def load_result(cassette: Cassette, request_id: str) -> Optional[Dict[str, Any]]:
+    """Return the recorded result record of a request, if it completed."""
+    for record in cassette.load_request(request_id):
+        if record['kind'] == 'result':
+            return record
+    return None
+
+def instrument_llm(llm: Any) -> Any:
+    """
+    Route an LLM's calls through the current cassette session.
+
+    The wrapper is installed on the instance so crewai's default model selection is kept.
+
+    Args:
+        llm: crewai LLM instance
+
+    Returns:
+        The same LLM instance
+    """
+    if llm is None or getattr(llm, '_cassette_instrumented', False):
+        return llm
+    original_call = llm.call
+
+    @functools.wraps(original_call)
+    def call(messages, tools=None, callbacks=None, available_functions=None):
+        session = current_session()
+        if session is None:
+            return original_call(messages, tools=tools, callbacks=callbacks,
+                                 available_functions=available_functions)
+
+        key = _key({'model': getattr(llm, 'model', None), 'messages': messages})
+        if session.mode == 'replay':
+            return session.take('llm', key)['response']
+
+        started = time.monotonic()
+        response = original_call(messages, tools=tools, callbacks=callbacks,
+                                 available_functions=available_functions)
+        session.record('llm', key=key, model=getattr(llm, 'model', None), messages=messages,
+                       response=response, latency_ms=(time.monotonic() - started) * 1000.0)
+        return response
+
+    llm.call = call
+    llm._cassette_instrumented = True
+    return llm
+
+def instrument_crew(crew: Any, settings: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Instrument the LLMs of every agent in a crew, including the manager, when cassettes are on.
+
+    Args:
+        crew: crewai Crew instance
+        settings (Dict, optional): Overrides cassette_settings()
+    """
+    settings = settings or cassette_settings()
+    if settings['mode'] == 'off':
+        return crew
+    agents = list(crew.agents or [])
+    if getattr(crew, 'manager_agent', None) is not None:
+        agents.append(crew.manager_agent)
+    for member in agents:
+        instrument_llm(getattr(member, 'llm', None))
+    if getattr(crew, 'manager_llm', None) is not None and not isinstance(crew.manager_llm, str):
+        instrument_llm(crew.manager_llm)
+    return crew
+
+def recorded_tool(run):
+    """
+    Decorate a tool's `_run` so its calls are recorded and replayed with the request.
+
+    Args:
+        run: The tool's `_run` method
+    """
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        session = current_session()
+        if session is None:
+            return run(self, *args, **kwargs)
+
+        key = _key({'tool': self.name, 'args': args, 'kwargs': kwargs})
+        if session.mode == 'replay':
+            return session.take('tool', key)['output']
+
+        started = time.monotonic()
+        output = run(self, *args, **kwargs)
+        session.record('tool', key=key, tool=self.name, args=list(args), kwargs=kwargs,
+                       output=output, latency_ms=(time.monotonic() - started) * 1000.0)
+        return output
+
+    return wrapper
@@ -1,15 +1,38 @@
 from crewai import Agent, Crew, Process, Task, LLM
 from crewai.project import CrewBase, agent, crew, task
+from crewai.tasks.output_format import OutputFormat
+from crewai.tasks.task_output import TaskOutput
 from llm_bot.tools.conversion_tools import (
     DistanceConversionTool, 
     AngleConversionTool,
     VisionTool,
-    ChatTool
+    ChatTool,
+    to_centimeters,
+    to_degrees
 )
 from pydantic import BaseModel, Field
-from typing import Optional, Union, Literal, Dict, Any, List
+from typing import Optional, Union, Literal, Dict, Any, List, Callable
 import json
+import os
 from pydantic import validator
+from llm_bot.cassette import instrument_crew
+from llm_bot.deadline import DeadlineExceeded, current_deadline, instrument_llm_deadline
+from llm_bot.fake_llm import agent_llm
+from llm_bot.log_config import get_logger, instrument_crew_prompts, verbose_output
+from llm_bot.prompts import instrument_llm_tokens, profile_config, profile_field, prompt_profile, prompt_stage
+from llm_bot.repair import (
+    MOVE_COMMANDS,
+    ROTATE_COMMANDS,
+    command_list_guardrail,
+    extract_json,
+    normalize_intent,
+    repair_command_response,
+    schema_guardrail,
+    try_repair
+)
+from llm_bot.settings import get_section
+
+logger = get_logger('crew')
 
 # Add validation metadata models
 class ValidationStatus(BaseModel):
@@ -48,6 +71,16 @@ class CommandResponse(BaseModel):
         description="Source of any unit conversions (e.g., 'rule-based', 'distance_tool')"
     )
 
+    @validator('rotate_degree', always=True)
+    def validate_measurement(cls, v, values, **kwargs):
+        """Ensure a motion command carries its amount in its own field"""
+        command = values.get('command')
+        if command in MOVE_COMMANDS and values.get('linear_distance') is None:
+            raise ValueError(f"{command} requires linear_distance")
+        if command in ROTATE_COMMANDS and v is None:
+            raise ValueError(f"{command} requires rotate_degree")
+        return v
+
 # Update BotResponseModel to include validation
 class BotResponseModel(BaseModel):
     responses: List[CommandResponse] = Field(
@@ -66,6 +99,237 @@ class BotResponseModel(BaseModel):
             raise ValueError("At least one response is required")
         return v
 
+class BudgetedTask(Task):
+    """Task that honours the current request deadline and falls back when it expires"""
+
+    fallback_response: Optional[str] = Field(
+        None,
+        description="Output returned instead of running the stage once the request deadline has expired"
+    )
+    fallback_builder: Optional[Callable[[List[Optional[TaskOutput]]], Any]] = Field(
+        None,
+        description="Builds the stage's output locally from its context outputs once the request deadline "
+                    "has expired; returns None when it cannot"
+    )
+    final_stage: bool = Field(
+        False,
+        description="Whether the stage may spend the share of the request budget held back for the final stage"
+    )
+
+    def _execute_core(self, agent, context, tools) -> TaskOutput:
+        # crewai records the executing agent on the task, which is the manager in a hierarchical crew;
+        # a reused crew would then only offer the manager itself as coworker on the next request
+        assigned_agent = self.agent
+        try:
+            # Attribute this stage's LLM calls, including delegated ones, in the token report
+            with prompt_stage(self.name):
+                return self._execute_budgeted(agent, context, tools)
+        finally:
+            self.agent = assigned_agent
+
+    def _execute_budgeted(self, agent, context, tools) -> TaskOutput:
+        # Called once per attempt, including guardrail retries, so retries stop with the budget
+        deadline = current_deadline()
+        if deadline is None:
+            return super()._execute_core(agent, context, tools)
+        if self.final_stage:
+            deadline.release_reserve()
+        if deadline.expired():
+            return self._degrade(agent, deadline)
+
+        # Each LLM call of the stage is capped at the remaining budget by instrument_llm_deadline
+        try:
+            return super()._execute_core(agent, context, tools)
+        except Exception:
+            if deadline.expired():
+                return self._degrade(agent, deadline)
+            raise
+
+    def _export_output(self, result: str):
+        # Repair near-valid output locally before crewai falls back to an LLM conversion; with a
+        # guardrail, output that stays invalid would also cost a task retry
+        if self.output_pydantic is not None and isinstance(result, str):
+            repaired = try_repair(result, self.output_pydantic, avoids_retry=self.guardrail is not None)
+            if repaired is not None:
+                return repaired, None
+        return super()._export_output(result)
+
+    def _degrade(self, agent, deadline) -> TaskOutput:
+        """Return the stage's fallback output, or abort the request if it has none"""
+        if self.fallback_builder is not None:
+            fallback = self.fallback_builder([task.output for task in self.context or []])
+        else:
+            fallback = self.fallback_response
+        if fallback is None:
+            raise DeadlineExceeded(self.name or 'unknown stage', deadline.degraded)
+
+        deadline.mark_degraded(self.name)
+        agent = agent or self.agent
+        model = fallback if isinstance(fallback, BaseModel) else None
+        self.output = TaskOutput(
+            name=self.name,
+            description=self.description,
+            expected_output=self.expected_output,
+            raw=model.model_dump_json() if model else fallback,
+            pydantic=model,
+            agent=agent.role if agent else "",
+            output_format=OutputFormat.PYDANTIC if model else OutputFormat.RAW
+        )
+        return self.output
+
+def fallback_response(task_config: Dict[str, Any]) -> Optional[str]:
+    """Read the `fallback` block of a tasks.yaml entry"""
+    fallback = task_config.get('fallback') or {}
+    if not fallback.get('enabled'):
+        return None
+    return fallback.get('default_response')
+
+def _command_list(output: Optional[TaskOutput]) -> Optional[List[Dict[str, Any]]]:
+    """Decode the command list of a parsing stage, None if it is not one."""
+    try:
+        data = extract_json(output.raw or "", []) if output else None
+    except ValueError:
+        return None
+    commands = data.get('responses') if isinstance(data, dict) else data
+    if not isinstance(commands, list):
+        return None
+    return [item for item in commands if isinstance(item, dict)]
+
+def _command_kind(item: Dict[str, Any]) -> Optional[str]:
+    """MOVE_*/ROTATE_* command of a parsed item, 'VISION', or None for chat and anything unknown."""
+    label = item.get('command_type', item.get('command'))
+    if isinstance(label, str) and label.strip().upper() == 'VISION':
+        return 'VISION'
+    command, known = normalize_intent(label)
+    return command if known else None
+
+def _converted_amount(item: Dict[str, Any], command: str) -> Optional[float]:
+    """Amount of a motion in cm or degrees, converted by the rule-based tables if no stage did."""
+    standard_unit, convert = ('cm', to_centimeters) if command in MOVE_COMMANDS else ('degrees', to_degrees)
+    converted = item.get('converted_value')
+    if isinstance(converted, (int, float)) and item.get('converted_unit', standard_unit) == standard_unit:
+        return float(converted)
+    value, unit = item.get('value'), item.get('unit')
+    if not isinstance(value, (int, float)) or not isinstance(unit, str):
+        return None
+    try:
+        return round(convert(float(value), unit), 2)
+    except ValueError:
+        return None
+
+def local_unit_conversion(outputs: List[Optional[TaskOutput]]) -> Optional[str]:
+    """
+    Fallback for unit_conversion_task: convert the parsed commands with the rule-based tables.
+
+    Args:
+        outputs (List[TaskOutput]): Context outputs, the command_processing_task output first
+
+    Returns:
+        Optional[str]: The command list with converted values, None if it could not be decoded
+    """
+    commands = _command_list(outputs[0] if outputs else None)
+    if commands is None:
+        return None
+    for item in commands:
+        command = _command_kind(item)
+        if command in MOVE_COMMANDS or command in ROTATE_COMMANDS:
+            amount = _converted_amount(item, command)
+            if amount is not None:
+                item['converted_value'] = amount
+                item['converted_unit'] = 'cm' if command in MOVE_COMMANDS else 'degrees'
+    return json.dumps({'responses': commands})
+
+def _stage_results(output: Optional[TaskOutput], key: str) -> List[Dict[str, Any]]:
+    """Raw outputs of a vision or chat stage, one per answered command when it returned a list."""
+    text = output.raw if output and output.raw else ""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        data = None
+    if isinstance(data, list) and data and all(isinstance(item, dict) for item in data):
+        return data
+    if isinstance(data, dict):
+        return [data]
+    return [{key: text or f"{key.capitalize()} output unavailable"}]
+
+def local_bot_response(outputs: List[Optional[TaskOutput]]) -> Optional[BotResponseModel]:
+    """
+    Fallback for response_generation_task: assemble the final response without the LLM.
+
+    Motions take the amounts of the parsing stages, vision and chat commands the output of their
+    stage, which may itself be a fallback. A motion without a usable amount is reported in
+    `missing_commands` rather than guessed.
+
+    Args:
+        outputs (List[TaskOutput]): Context outputs: converted commands, vision_task, chat_task
+
+    Returns:
+        Optional[BotResponseModel]: The response, None if the command list could not be decoded
+    """
+    outputs = list(outputs) + [None] * (3 - len(outputs))
+    commands = _command_list(outputs[0])
+    if not commands:
+        return None
+    results = {'VISION': _stage_results(outputs[1], 'vision'), None: _stage_results(outputs[2], 'chat')}
+    used = {'VISION': 0, None: 0}
+
+    fixes: List[str] = []
+    responses, missing = [], []
+    for item in commands:
+        command = _command_kind(item)
+        if command in MOVE_COMMANDS or command in ROTATE_COMMANDS:
+            amount = _converted_amount(item, command)
+            if amount is None:
+                missing.append(str(item.get('original_text') or command))
+                continue
+            moving = command in MOVE_COMMANDS
+            response = {
+                'command': command,
+                'linear_distance': amount if moving else None,
+                'rotate_degree': None if moving else amount,
+                'conversion_source': 'rule-based'
+            }
+        else:
+            stage_results = results[command]
+            response = {
+                'command': None,
+                'raw_output': stage_results[min(used[command], len(stage_results) - 1)]
+            }
+            used[command] += 1
+        response = repair_command_response(response, fixes)
+        if not response.get('description'):
+            response['description'] = "No description available."
+        responses.append(response)
+
+    if not responses:
+        return None
+    return BotResponseModel.model_validate({
+        'responses': responses,
+        'validation': {
+            'status': 'FAIL' if missing else 'PASS',
+            'missing_commands': missing or None,
+            'validation_details': {'source': 'deadline_fallback'}
+        }
+    })
+
+CREW_PROCESSES = ('hierarchical', 'sequential')
+
+def crew_settings() -> Dict[str, Any]:
+    """
+    Execution mode from the `crew` section of runtime.yaml.
+
+    LLM_BOT_CREW_PROCESS and LLM_BOT_MERGE_PARSING override `process` and `merge_parsing`.
+    """
+    config = get_section('crew')
+    process = os.environ.get('LLM_BOT_CREW_PROCESS', config.get('process', 'hierarchical'))
+    if process not in CREW_PROCESSES:
+        raise ValueError(f"Unknown crew process: {process!r}")
+    if 'LLM_BOT_MERGE_PARSING' in os.environ:
+        merge_parsing = os.environ['LLM_BOT_MERGE_PARSING'].lower() in ('1', 'true', 'yes')
+    else:
+        merge_parsing = bool(config.get('merge_parsing', False))
+    return {'process': process, 'merge_parsing': merge_parsing}
+
 @CrewBase
 class LlmBot():
     """LlmBot crew for command processing and response generation"""
@@ -73,12 +337,45 @@ class LlmBot():
     agents_config = 'config/agents.yaml'
     tasks_config = 'config/tasks.yaml'
 
+    # Prompt profile ("full" or "compact"); runtime.yaml `prompts.profile` when unset
+    profile: Optional[str] = None
+
+    def _profile(self) -> str:
+        return self.profile or prompt_profile()
+
+    def _agent_config(self, name: str) -> Dict[str, Any]:
+        return profile_config('agents', name, self.agents_config[name], self._profile())
+
+    def _task_config(self, name: str) -> Dict[str, Any]:
+        return profile_config('tasks', name, self.tasks_config[name], self._profile())
+
+    def _expected_output(self, name: str, default: str) -> str:
+        return profile_field('tasks', name, 'expected_output', default, self._profile())
+
+    # Execution mode; runtime.yaml `crew.process` and `crew.merge_parsing` when unset
+    crew_process: Optional[str] = None
+    merge_parsing: Optional[bool] = None
+
+    def _sequential(self) -> bool:
+        return (self.crew_process or crew_settings()['process']) == 'sequential'
+
+    def _merged(self) -> bool:
+        """Whether commands are parsed and converted by one task (sequential mode only)"""
+        merge = self.merge_parsing if self.merge_parsing is not None else crew_settings()['merge_parsing']
+        return self._sequential() and merge
+
+    def _converted_commands_task(self) -> Task:
+        """Task whose output lists the converted commands for the vision, chat and response stages"""
+        return self.command_parsing_task() if self._merged() else self.unit_conversion_task()
+
     # Define agents with their specific tools
     @agent
     def manager_agent(self) -> Agent:
         return Agent(
-            config=self.agents_config['manager_agent'],
-            verbose=True,
+            config=self._agent_config('manager_agent'),
+            # With the fake LLM, the manager delegates each task once to its agent, as a live manager would
+            llm=agent_llm(delegate=True),
+            verbose=verbose_output(),
             allow_delegation=True,
             backstory_additions="When delegating tasks, provide task descriptions as simple strings, not complex objects."
         )
@@ -86,24 +383,27 @@ class LlmBot():
     @agent
     def command_processor_agent(self) -> Agent:
         return Agent(
-            config=self.agents_config['command_processor_agent'],
+            config=self._agent_config('command_processor_agent'),
+            llm=agent_llm(),
             tools=[
                 DistanceConversionTool(), 
                 AngleConversionTool()
             ],
-            verbose=True,
-            allow_delegation=True,
+            verbose=verbose_output(),
+            # Tasks have fixed agents in sequential mode, so delegating would only add LLM calls
+            allow_delegation=not self._sequential(),
             memory=False
         )
 
     @agent
     def vision_agent(self) -> Agent:
         return Agent(
-            config=self.agents_config['vision_agent'],
+            config=self._agent_config('vision_agent'),
+            llm=agent_llm(),
             tools=[
                 VisionTool(result_as_answer=True)  # Force tool output as result
             ],
-            verbose=True,
+            verbose=verbose_output(),
             force_tool_output=True,  # Ensure the tool output is returned directly
             allow_delegation=False
         )
@@ -111,11 +411,12 @@ class LlmBot():
     @agent
     def chat_agent(self) -> Agent:
         return Agent(
-            config=self.agents_config['chat_agent'],
+            config=self._agent_config('chat_agent'),
+            llm=agent_llm(),
             tools=[
                 ChatTool(result_as_answer=True)  # Force tool output as result
             ],
-            verbose=True,
+            verbose=verbose_output(),
             force_tool_output=True,  # Ensure the tool output is returned directly
             allow_delegation=False
         )
@@ -123,17 +424,18 @@ class LlmBot():
     @agent
     def response_generator_agent(self) -> Agent:
         return Agent(
-            config=self.agents_config['response_generator_agent'],
-            verbose=True,
+            config=self._agent_config('response_generator_agent'),
+            llm=agent_llm(),
+            verbose=verbose_output(),
             allow_delegation=False
         )
 
     # Define tasks
     @task
     def command_processing_task(self) -> Task:
-        return Task(
-            config=self.tasks_config['command_processing_task'],
-            expected_output="""
+        return BudgetedTask(
+            config=self._task_config('command_processing_task'),
+            expected_output=self._expected_output('command_processing_task', """
             {
                 "responses": [
                     {
@@ -144,16 +446,18 @@ class LlmBot():
                     }
                 ]
             }
-            """,
+            """),
+            guardrail=command_list_guardrail,
             max_retries=3
         )
 
     @task
     def unit_conversion_task(self) -> Task:
-        return Task(
-            config=self.tasks_config['unit_conversion_task'],
+        return BudgetedTask(
+            config=self._task_config('unit_conversion_task'),
+            fallback_builder=local_unit_conversion,
             context=[self.command_processing_task()],
-            expected_output="""
+            expected_output=self._expected_output('unit_conversion_task', """
             {
                 "responses": [
                     {
@@ -166,17 +470,41 @@ class LlmBot():
                     }
                 ]
             }
-            """,
+            """),
             max_retries=2
         )
 
+    @task
+    def command_parsing_task(self) -> Task:
+        # Sequential mode with merge_parsing: command_processing_task and unit_conversion_task in one call
+        return BudgetedTask(
+            config=self._task_config('command_parsing_task'),
+            expected_output=self._expected_output('command_parsing_task', """
+            {
+                "responses": [
+                    {
+                        "command_type": "string",
+                        "original_text": "string",
+                        "value": "number or null",
+                        "unit": "string or null",
+                        "converted_value": "number or null",
+                        "converted_unit": "string or null"
+                    }
+                ]
+            }
+            """),
+            guardrail=command_list_guardrail,
+            max_retries=3
+        )
+
     @task
     def vision_task(self) -> Task:
-        return Task(
-            config=self.tasks_config['vision_task'],
-            context=[self.unit_conversion_task()],
+        return BudgetedTask(
+            config=self._task_config('vision_task'),
+            fallback_response=fallback_response(self.tasks_config['vision_task']),
+            context=[self._converted_commands_task()],
             tools=[VisionTool(result_as_answer=True)],
-            expected_output="""
+            expected_output=self._expected_output('vision_task', """
             {
                 "responses": [
                     {
@@ -186,17 +514,18 @@ class LlmBot():
                     }
                 ]
             }
-            """,
+            """),
             max_retries=2
         )
 
     @task
     def chat_task(self) -> Task:
-        return Task(
-            config=self.tasks_config['chat_task'],
-            context=[self.unit_conversion_task()],
+        return BudgetedTask(
+            config=self._task_config('chat_task'),
+            fallback_response=fallback_response(self.tasks_config['chat_task']),
+            context=[self._converted_commands_task()],
             tools=[ChatTool(result_as_answer=True)],
-            expected_output="""
+            expected_output=self._expected_output('chat_task', """
             {
                 "responses": [
                     {
@@ -206,7 +535,7 @@ class LlmBot():
                     }
                 ]
             }
-            """,
+            """),
             max_retries=2
         )
 
@@ -318,11 +647,14 @@ class LlmBot():
             }
         }
         
-        return Task(
-            config=self.tasks_config['response_generation_task'],
-            context=[self.unit_conversion_task(), self.vision_task(), self.chat_task()],
+        return BudgetedTask(
+            config=self._task_config('response_generation_task'),
+            # Runs on the budget held back for it, and is assembled locally if even that runs out
+            final_stage=True,
+            fallback_builder=local_bot_response,
+            context=[self._converted_commands_task(), self.vision_task(), self.chat_task()],
             output_pydantic=BotResponseModel,
-            # guardrail=validate_complete_responses,
+            guardrail=schema_guardrail(BotResponseModel),
             max_retries=3,
             description_additions=f"""
             JSON OUTPUT STRUCTURE: {model_info}. 
@@ -351,29 +683,52 @@ class LlmBot():
 
     @crew
     def crew(self) -> Crew:
-        """Creates the command processing crew with hierarchical process"""
-        try:
-            manager_llm = LLM(model="gpt-4o")
-        except Exception as e:
-            print(f"Warning: Failed to create manager LLM with gpt-4o: {e}")
-            manager_llm = None
+        """Creates the command processing crew, hierarchical or sequential per `crew.process`"""
+        agents = [
+            self.command_processor_agent(),
+            self.vision_agent(),
+            self.chat_agent(),
+            self.response_generator_agent()
+        ]
+        if self._merged():
+            parsing_tasks = [self.command_parsing_task()]
+        else:
+            parsing_tasks = [self.command_processing_task(), self.unit_conversion_task()]
+        tasks = parsing_tasks + [
+            self.vision_task(),
+            self.chat_task(),
+            self.response_generation_task()
+        ]
+
+        if self._sequential():
+            # Each task runs on its tasks.yaml agent with no manager deciding delegation
+            bot_crew = Crew(
+                agents=agents,
+                tasks=tasks,
+                process=Process.sequential,
+                verbose=verbose_output()
+            )
+        else:
+            try:
+                manager_llm = LLM(model="gpt-4o")
+            except Exception as e:
+                logger.warning(f"Failed to create manager LLM with gpt-4o: {e}")
+                manager_llm = None
+
+            bot_crew = Crew(
+                agents=agents,
+                tasks=tasks,
+                process=Process.hierarchical,
+                manager_agent=self.manager_agent(),
+                manager_llm=manager_llm,
+                verbose=verbose_output()
+            )
         
-        return Crew(
-            agents=[
-                self.command_processor_agent(),
-                self.vision_agent(),
-                self.chat_agent(),
-                self.response_generator_agent()
-            ],
-            tasks=[
-                self.command_processing_task(),
-                self.unit_conversion_task(),
-                self.vision_task(),
-                self.chat_task(),
-                self.response_generation_task()
-            ],
-            process=Process.hierarchical,
-            manager_agent=self.manager_agent(),
-            manager_llm=manager_llm,
-            verbose=True
-        )
\ No newline at end of file
+        # Route agent LLM calls through the cassette and prompt-sampling hooks when enabled
+        instrument_crew(bot_crew)
+        instrument_crew_prompts(bot_crew)
+        for name in ('manager_agent', 'command_processor_agent', 'vision_agent', 'chat_agent',
+                     'response_generator_agent'):
+            instrument_llm_tokens(getattr(self, name)().llm, name)
+            instrument_llm_deadline(getattr(self, name)().llm)
+        return bot_crew
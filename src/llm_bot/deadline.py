@@ -0,0 +1,164 @@
+"""
+Request deadlines for the LLM Bot.
+A Deadline is created per request and made current for the duration of crew.kickoff,
+so every stage can read the remaining budget and degrade instead of running unbounded.
+"""
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from llm_bot.settings import get_section
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage without a fallback runs out of request budget."""
+
+    def __init__(self, stage: str, degraded: Optional[List[str]] = None):
+        super().__init__(f"Request deadline exceeded during {stage}")
+        self.stage = stage
+        self.degraded = list(degraded or [])
+
+class Deadline:
+    """
+    Monotonic request deadline.
+
+    The last `reserve_ms` of the budget is held back for the final stage: earlier stages see a
+    deadline that expires before it, so they degrade while the final stage still has time to run.
+
+    Attributes:
+        budget_ms (float): Total budget granted to the request
+        reserve_ms (float): Share of the budget held back until release_reserve() is called
+        expires_at (float): time.monotonic() value at which the budget runs out for the current stage
+        degraded (List[str]): Stages that returned their fallback response
+    """
+
+    def __init__(self, budget_ms: float, reserve_ms: float = 0.0):
+        """
+        Start a deadline.
+
+        Args:
+            budget_ms (float): Budget in milliseconds, measured from now
+            reserve_ms (float): Part of the budget held back for the final stage
+        """
+        self.budget_ms = float(budget_ms)
+        self.reserve_ms = min(max(0.0, float(reserve_ms)), self.budget_ms)
+        self.started_at = time.monotonic()
+        self._final_expires_at = self.started_at + self.budget_ms / 1000.0
+        self.expires_at = self._final_expires_at - self.reserve_ms / 1000.0
+        self.degraded: List[str] = []
+
+    @classmethod
+    def from_request(cls, data: Dict[str, Any]) -> 'Deadline':
+        """
+        Build a deadline from a client request.
+
+        Uses `deadline_ms` from the request when present, otherwise the server
+        default from runtime.yaml, and clamps it to the configured maximum.
+        `deadline.response_reserve` of the budget is held back for response generation.
+
+        Args:
+            data (Dict): Request payload
+
+        Returns:
+            Deadline: Started deadline for the request
+
+        Raises:
+            ValueError: If `deadline_ms` is not a positive number
+        """
+        config = get_section('deadline')
+        default_ms = float(config.get('default_ms', 30000))
+        max_ms = float(config.get('max_ms', default_ms))
+
+        reserve = float(config.get('response_reserve', 0.2))
+
+        requested = data.get('deadline_ms')
+        if requested is None:
+            return cls(default_ms, default_ms * reserve)
+        try:
+            budget_ms = float(requested)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid deadline_ms: {requested!r}")
+        if budget_ms <= 0:
+            raise ValueError(f"Invalid deadline_ms: {requested!r}")
+        budget_ms = min(budget_ms, max_ms)
+        return cls(budget_ms, budget_ms * reserve)
+
+    def remaining(self) -> float:
+        """Seconds left in the budget, never negative."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed_ms(self) -> float:
+        """Milliseconds spent since the deadline started."""
+        return (time.monotonic() - self.started_at) * 1000.0
+
+    def expired(self) -> bool:
+        """Whether the budget has run out."""
+        return time.monotonic() >= self.expires_at
+
+    def release_reserve(self) -> None:
+        """Give the held-back share of the budget to the stage now running."""
+        self.expires_at = self._final_expires_at
+
+    def mark_degraded(self, stage: str) -> None:
+        """Record that a stage fell back to its default response."""
+        if stage not in self.degraded:
+            self.degraded.append(stage)
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar('llm_bot_deadline', default=None)
+
+def current_deadline() -> Optional[Deadline]:
+    """Return the deadline of the request being processed, if any."""
+    return _current_deadline.get()
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """
+    Make a deadline current for the enclosed block.
+
+    Args:
+        deadline (Deadline, optional): Deadline to install, None disables enforcement
+    """
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+def instrument_llm_deadline(llm: Any) -> Any:
+    """
+    Enforce the current request deadline on every call of an LLM.
+
+    Each call runs with the remaining budget as its timeout, and the LLM's own timeout is restored
+    afterwards because crews are reused across requests. Once the budget is spent calls raise
+    DeadlineExceeded without reaching the model, which also bounds crewai's agent retries and any
+    further reasoning iterations of a stage.
+
+    Args:
+        llm: crewai LLM of an agent, None is ignored
+
+    Returns:
+        The same LLM, instrumented once
+    """
+    if llm is None or getattr(llm, '_deadline_instrumented', False):
+        return llm
+    original_call = llm.call
+
+    @functools.wraps(original_call)
+    def call(*args, **kwargs):
+        deadline = current_deadline()
+        if deadline is None or not hasattr(llm, 'timeout'):
+            return original_call(*args, **kwargs)
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded('LLM call', deadline.degraded)
+        configured = llm.timeout
+        llm.timeout = remaining if configured is None else min(configured, remaining)
+        try:
+            return original_call(*args, **kwargs)
+        finally:
+            llm.timeout = configured
+
+    llm.call = call
+    llm._deadline_instrumented = True
+    return llm
@@ -0,0 +1,148 @@
+"""
+Offline fake LLM for the LLM Bot.
+Answers every agent call immediately with a schema-valid final answer after a simulated latency,
+so the servers and benchmarks can run without network access or API keys, reproducibly. A fake
+manager delegates each task once to the coworker its delegation tool offers before answering, as a
+hierarchical crew's manager does.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from crewai import LLM
+
+from llm_bot.settings import get_section
+
+FAKE_MODEL = "fake/llm-bot"
+
+DELEGATE_TOOL = "Delegate work to coworker"
+
+# crewai's description of the delegation tool; in a hierarchical crew it only offers the task's own agent
+_COWORKERS_RE = re.compile(r"Delegate a specific task to one of the following coworkers: ([^\n]+)")
+_CURRENT_TASK_RE = re.compile(r"Current Task: ([^\n]+)")
+
+FAKE_ANSWER = {
+    "responses": [{
+        "command": None,
+        "linear_distance": None,
+        "rotate_degree": None,
+        "description": "This is a response from the offline fake LLM.",
+        "raw_output": None,
+        "processed_by": "fake_llm",
+        "conversion_source": None
+    }],
+    "validation": {"status": "PASS"}
+}
+
+class FakeLLM(LLM):
+    """
+    crewai LLM that never leaves the process.
+
+    Attributes:
+        latency_ms (float): Mean simulated latency per call
+        jitter_ms (float): Uniform jitter added to or subtracted from the latency
+        delegate (bool): Delegate each task before answering, for a manager agent
+        calls (int): Calls served by this instance
+    """
+
+    def __init__(self, latency_ms: float = 50.0, jitter_ms: float = 0.0, seed: Optional[int] = None,
+                 answer: Optional[Dict[str, Any]] = None, delegate: bool = False):
+        super().__init__(model=FAKE_MODEL)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.delegate = delegate
+        self.answer = json.dumps(answer or FAKE_ANSWER)
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+        # Honour the per-call timeout the request deadline assigns
+        if self.timeout is not None and delay > self.timeout:
+            time.sleep(self.timeout)
+            raise TimeoutError(f"Fake LLM call exceeded timeout of {self.timeout:.3f}s")
+        time.sleep(delay)
+        coworker = _offered_coworker(messages) if self.delegate else None
+        if coworker and not _has_observation(messages):
+            # First step of a manager's task: delegate, then answer once the coworker's result is observed
+            # The task text makes each delegation distinct, so crewai's tool cache does not answer it
+            action_input = json.dumps({
+                "task": _current_task(messages),
+                "context": "Delegated by the offline fake manager.",
+                "coworker": coworker
+            })
+            return (f"Thought: I should delegate this task to a coworker\n"
+                    f"Action: {DELEGATE_TOOL}\nAction Input: {action_input}")
+        return f"Thought: I now know the final answer\nFinal Answer: {self.answer}"
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def supports_stop_words(self) -> bool:
+        return True
+
+    def get_context_window_size(self) -> int:
+        return 128000
+
+def _text(messages: Union[str, List[Dict[str, str]]]) -> str:
+    if isinstance(messages, str):
+        return messages
+    return '\n'.join(str(message.get('content') or '') for message in messages or [])
+
+def _offered_coworker(messages: Union[str, List[Dict[str, str]]]) -> Optional[str]:
+    # The first coworker named in the delegation tool's description; roles may be multi-line YAML
+    # scalars, so only the first line of the list is taken
+    match = _COWORKERS_RE.search(_text(messages))
+    return match.group(1).split(', ')[0].strip() if match else None
+
+def _current_task(messages: Union[str, List[Dict[str, str]]]) -> str:
+    match = _CURRENT_TASK_RE.search(_text(messages))
+    return match.group(1).strip() if match else "Complete the current task and return its result as JSON."
+
+def _has_observation(messages: Union[str, List[Dict[str, str]]]) -> bool:
+    # The format instructions in the prompt mention "Observation:" too, so only the agent's own
+    # earlier steps count; crewai appends those as assistant messages ending in the tool result
+    if isinstance(messages, str):
+        return False
+    return any(message.get('role') == 'assistant' and "Observation:" in str(message.get('content') or '')
+               for message in messages or [])
+
+def fake_llm_enabled() -> bool:
+    """Whether agents should use the fake LLM (runtime.yaml `fake_llm.enabled` or LLM_BOT_FAKE_LLM=1)."""
+    if 'LLM_BOT_FAKE_LLM' in os.environ:
+        return os.environ['LLM_BOT_FAKE_LLM'].lower() in ('1', 'true', 'yes')
+    return bool(get_section('fake_llm').get('enabled', False))
+
+def agent_llm(delegate: bool = False) -> Optional[LLM]:
+    """
+    LLM to give each agent.
+
+    Args:
+        delegate (bool): For the manager agent, have the fake LLM delegate each task to its coworker
+
+    Returns:
+        Optional[LLM]: A FakeLLM when enabled, otherwise None so crewai picks its default model
+    """
+    if not fake_llm_enabled():
+        return None
+    config = get_section('fake_llm')
+    return FakeLLM(
+        latency_ms=float(os.environ.get('LLM_BOT_FAKE_LLM_LATENCY_MS', config.get('latency_ms', 50))),
+        jitter_ms=float(config.get('jitter_ms', 0)),
+        seed=config.get('seed'),
+        delegate=delegate
+    )
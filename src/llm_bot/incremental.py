@@ -0,0 +1,420 @@
+"""
+Incremental parsing of streamed command text for the LLM Bot.
+Speech front-ends send an utterance word by word. Each clause is parsed as soon as it is complete, and
+plain motion clauses ("move forward 5 feet", "turn left 90 degrees") are confirmed locally without the
+crew as soon as the first word of the next clause shows they are neither continued ("... and 3 inches")
+nor corrected ("no wait, ..."). Only the remaining clauses (vision, chat or anything ambiguous) are sent
+to the crew at the end of the utterance, and the two sets of responses are merged back in spoken order.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm_bot.tools.conversion_tools import ANGLE_TO_DEGREES, DISTANCE_TO_CM, to_centimeters, to_degrees
+
+# WebSocket sub-protocol a client requests to stream partial command text
+SUBPROTOCOL = 'llm-bot.incremental.v1'
+
+PROCESSED_BY = 'incremental_parser'
+
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'fifteen': 15, 'twenty': 20,
+    'thirty': 30, 'forty': 40, 'forty-five': 45, 'fifty': 50, 'sixty': 60, 'ninety': 90
+}
+
+MOVE_DIRECTIONS = {
+    'forward': 'MOVE_FORWARD', 'forwards': 'MOVE_FORWARD', 'ahead': 'MOVE_FORWARD', 'straight': 'MOVE_FORWARD',
+    'back': 'MOVE_BACKWARD', 'backward': 'MOVE_BACKWARD', 'backwards': 'MOVE_BACKWARD'
+}
+
+ROTATE_DIRECTIONS = {
+    'clockwise': 'ROTATE_CLOCKWISE', 'right': 'ROTATE_CLOCKWISE',
+    'counterclockwise': 'ROTATE_COUNTERCLOCKWISE', 'counter-clockwise': 'ROTATE_COUNTERCLOCKWISE',
+    'anticlockwise': 'ROTATE_COUNTERCLOCKWISE', 'anti-clockwise': 'ROTATE_COUNTERCLOCKWISE',
+    'left': 'ROTATE_COUNTERCLOCKWISE'
+}
+
+# Separators between clauses; a period only counts when it is not a decimal point
+_BOUNDARY = re.compile(
+    r"(?:\s*(?:[,;!?]+|\.(?!\d)|\b(?:and|then|also|after\s+that)(?=\s|$))\s*)+",
+    re.IGNORECASE
+)
+_FILLER = re.compile(r"^(?:(?:please|now|first|next|finally|and|then|also)\s+)+|\s+please$")
+
+# A clause that takes back the one before it: on its own ("no wait"), leading the replacement
+# ("actually turn right 90 degrees") or trailing it ("turn right 90 degrees instead")
+_CORRECTION_WORDS = r"(?:no|nope|wait|actually|sorry|oops|instead|i\s+mean|scratch\s+that|cancel\s+that)"
+_CORRECTION_ONLY = re.compile(rf"(?:{_CORRECTION_WORDS}\b[\s,]*)+", re.IGNORECASE)
+_CORRECTION_PREFIX = re.compile(r"^(?:(?:no\s+wait|actually|sorry|oops|instead|i\s+mean)\b[\s,]*)+", re.IGNORECASE)
+_CORRECTION_SUFFIX = re.compile(r"[\s,]+instead$", re.IGNORECASE)
+
+# First words of a clause that may still continue or correct the motion before it
+_CORRECTION_STARTS = {'no', 'nope', 'wait', 'actually', 'sorry', 'oops', 'instead', 'i', 'scratch', 'cancel'}
+_FILLER_WORDS = {'please', 'now', 'first', 'next', 'finally'}
+
+def _alternatives(words) -> str:
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+_NUMBER = rf"(?P<value>\d+(?:\.\d+)?|{_alternatives(NUMBER_WORDS)})"
+_MOVE_VERB = r"(?:move|go|drive|walk|head|roll)"
+_ROTATE_VERB = r"(?:rotate|turn|spin|pivot)"
+_MOVE_DIRECTION = rf"(?P<direction>{_alternatives(MOVE_DIRECTIONS)})"
+_ROTATE_DIRECTION = rf"(?:to\s+the\s+)?(?P<direction>{_alternatives(ROTATE_DIRECTIONS)})"
+_DISTANCE = rf"(?:by\s+)?{_NUMBER}\s*(?P<unit>{_alternatives(DISTANCE_TO_CM)})"
+_ANGLE = rf"(?:by\s+)?{_NUMBER}\s*(?P<unit>{_alternatives(ANGLE_TO_DEGREES)})"
+
+_AMOUNT = re.compile(rf"(?:by\s+)?{_NUMBER}\s*(?P<unit>{_alternatives(list(DISTANCE_TO_CM) + list(ANGLE_TO_DEGREES))})")
+
+MOTION_PATTERNS = [
+    ('move', re.compile(rf"{_MOVE_VERB}\s+{_MOVE_DIRECTION}\s+{_DISTANCE}")),
+    ('move', re.compile(rf"{_MOVE_VERB}\s+{_DISTANCE}\s+{_MOVE_DIRECTION}")),
+    ('rotate', re.compile(rf"{_ROTATE_VERB}\s+{_ROTATE_DIRECTION}\s+{_ANGLE}")),
+    ('rotate', re.compile(rf"{_ROTATE_VERB}\s+{_ANGLE}\s+{_ROTATE_DIRECTION}"))
+]
+
+def parse_motion(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse a clause that is exactly one motion command with an explicit amount and unit.
+
+    Args:
+        text (str): A single clause
+
+    Returns:
+        Optional[Dict]: A CommandResponse-shaped dict, or None if the clause needs the crew
+    """
+    clause = _FILLER.sub('', text.lower().strip().rstrip('.!?'))
+    for kind, pattern in MOTION_PATTERNS:
+        match = pattern.fullmatch(clause)
+        if match is None:
+            continue
+        value = _number(match.group('value'))
+        if kind == 'move':
+            return _move_response(MOVE_DIRECTIONS[match.group('direction')],
+                                  to_centimeters(value, match.group('unit')))
+        return _rotate_response(ROTATE_DIRECTIONS[match.group('direction')],
+                                to_degrees(value, match.group('unit')))
+    return None
+
+def parse_amount(text: str) -> Optional[Tuple[str, float]]:
+    """
+    Parse a clause that is only an amount with a unit, such as "3 inches" or "and 10 degrees".
+
+    Args:
+        text (str): A single clause
+
+    Returns:
+        Optional[Tuple[str, float]]: ('distance', centimeters) or ('angle', degrees), None otherwise
+    """
+    clause = _FILLER.sub('', text.lower().strip().rstrip('.!?'))
+    match = _AMOUNT.fullmatch(clause)
+    if match is None:
+        return None
+    value, unit = _number(match.group('value')), match.group('unit')
+    if unit in DISTANCE_TO_CM:
+        return 'distance', to_centimeters(value, unit)
+    return 'angle', to_degrees(value, unit)
+
+def split_correction(text: str) -> Optional[str]:
+    """
+    Recognise a clause that takes back the previous one.
+
+    Returns:
+        Optional[str]: The replacement text ('' for a bare "no wait"), or None if the clause is not a correction
+    """
+    clause = text.strip()
+    if _CORRECTION_ONLY.fullmatch(clause):
+        return ''
+    prefix = _CORRECTION_PREFIX.match(clause)
+    if prefix:
+        return clause[prefix.end():].strip()
+    suffix = _CORRECTION_SUFFIX.search(clause)
+    if suffix:
+        return clause[:suffix.start()].strip()
+    return None
+
+def may_change_motion(text: str) -> bool:
+    """
+    Whether a clause that has only begun may still continue or correct the motion before it.
+
+    Only the complete words of `text` (those followed by whitespace) are considered. The clause may
+    change the motion while it has no such word yet, or when its first word after any filler starts
+    an amount ("3 inches", "by 10 degrees") or a correction ("no wait", "actually ...").
+
+    Args:
+        text (str): Beginning of the clause after an open motion
+
+    Returns:
+        bool: False once the clause is known to be a new command
+    """
+    end = len(text)
+    while end > 0 and not text[end - 1].isspace():
+        end -= 1
+    words = [word for word in text[:end].lower().split() if word not in _FILLER_WORDS]
+    if not words:
+        return True
+    first = words[0].strip(',;')
+    return first in NUMBER_WORDS or first[:1].isdigit() or first == 'by' or first in _CORRECTION_STARTS
+
+def _number(raw_value: str) -> float:
+    return float(NUMBER_WORDS.get(raw_value, raw_value))
+
+def _move_response(command: str, distance: float) -> Dict[str, Any]:
+    distance = round(distance, 2)
+    verb = 'forward' if command == 'MOVE_FORWARD' else 'backward'
+    return _motion_response(command, distance, None, f"Moving {verb} {distance:g} cm.")
+
+def _rotate_response(command: str, degrees: float) -> Dict[str, Any]:
+    degrees = round(degrees, 2)
+    verb = 'clockwise' if command == 'ROTATE_CLOCKWISE' else 'counterclockwise'
+    return _motion_response(command, None, degrees, f"Rotating {verb} {degrees:g} degrees.")
+
+def adjust_motion(response: Dict[str, Any], amount: Tuple[str, float], replace: bool) -> Optional[Dict[str, Any]]:
+    """
+    Add an amount to a motion response, or replace its amount.
+
+    Returns:
+        Optional[Dict]: The adjusted response, None if the amount's unit does not fit the motion
+    """
+    kind, value = amount
+    if kind == 'distance' and response['linear_distance'] is not None:
+        return _move_response(response['command'], value if replace else response['linear_distance'] + value)
+    if kind == 'angle' and response['rotate_degree'] is not None:
+        return _rotate_response(response['command'], value if replace else response['rotate_degree'] + value)
+    return None
+
+def _motion_response(command: str, distance: Optional[float], degrees: Optional[float],
+                     description: str) -> Dict[str, Any]:
+    return {
+        'command': command,
+        'linear_distance': distance,
+        'rotate_degree': degrees,
+        'description': description,
+        'raw_output': None,
+        'processed_by': PROCESSED_BY,
+        'conversion_source': 'rule-based'
+    }
+
+class Clause:
+    """
+    One clause of an utterance.
+
+    Attributes:
+        index (int): Position in the utterance
+        text (str): Clause text without its separator
+        raw (str): Clause text including the separator that ended it
+        response (Dict, optional): Locally confirmed motion response, None if the crew must handle it
+    """
+
+    def __init__(self, index: int, text: str, raw: str):
+        self.index = index
+        self.text = text
+        self.raw = raw
+        self.response = parse_motion(text)
+
+    def to_message(self) -> Dict[str, Any]:
+        """Message sent to the client when the clause is confirmed."""
+        return {'type': 'confirmed', 'index': self.index, 'clause': self.text, 'response': self.response}
+
+    def extend(self, text: str, raw: str) -> None:
+        """
+        Append a bare amount that continues this clause ("move forward 5 feet" + "3 inches").
+
+        The amount is added to a motion in the same kind of unit; any other combination is
+        ambiguous and leaves the clause to the crew.
+        """
+        amount = parse_amount(text)
+        if self.response is not None:
+            self.response = adjust_motion(self.response, amount, replace=False) if amount else None
+        self.text = f"{self.text} {text.strip()}"
+        self.raw += raw
+
+class IncrementalParser:
+    """
+    Parse state of one utterance on one connection.
+
+    Text is split into clauses only up to the last whitespace, since the final word may still be
+    growing, and a clause is complete once the separator after it has arrived. The latest clause stays
+    open while the next one may still change it: a bare amount extends it and a correction discards it.
+    It is closed, and a motion confirmed, as soon as the next clause starts with any other word, so a
+    motion is confirmed while the rest of the utterance is still being spoken. A trailing "instead"
+    therefore cannot take back a motion; the correction has to lead its clause.
+
+    A motion discarded by a bare correction ("go forward 5 feet, sorry, ...") is kept for one clause,
+    so that a following bare amount restores it with the new amount.
+
+    Attributes:
+        clauses (List[Clause]): Completed clauses in spoken order
+    """
+
+    def __init__(self):
+        self.clauses: List[Clause] = []
+        self._open = False
+        self._discarded: Optional[Clause] = None
+        self._buffer = ''
+        self._text = ''
+
+    @property
+    def text(self) -> str:
+        """Full utterance received so far."""
+        return self._text
+
+    def feed(self, text: str) -> List[Clause]:
+        """
+        Add streamed text and parse any clauses it completes.
+
+        Returns:
+            List[Clause]: Motion clauses confirmed by this text
+        """
+        self._text += text
+        self._buffer += text
+        settled = len(self._buffer)
+        while settled > 0 and not self._buffer[settled - 1].isspace():
+            settled -= 1
+        confirmed = self._split(settled, final=False)
+        # The clause being spoken cannot change the open motion any more
+        if self._open and not may_change_motion(self._buffer):
+            confirmed.extend(self._close())
+        return confirmed
+
+    def finish(self) -> List[Clause]:
+        """
+        Complete the utterance, parsing whatever remains buffered.
+
+        Returns:
+            List[Clause]: Motion clauses confirmed at the end of the utterance
+        """
+        confirmed = self._split(len(self._buffer), final=True)
+        return confirmed + self._close()
+
+    def _split(self, end: int, final: bool) -> List[Clause]:
+        settled = self._buffer[:end]
+        confirmed = []
+        start = 0
+        for match in _BOUNDARY.finditer(settled):
+            if match.start() > start:
+                confirmed.extend(self._add(settled[start:match.start()], settled[start:match.end()]))
+            start = match.end()
+        if final:
+            if settled[start:].strip():
+                confirmed.extend(self._add(settled[start:], settled[start:]))
+            start = end
+        self._buffer = self._buffer[start:]
+        return confirmed
+
+    def _add(self, text: str, raw: str) -> List[Clause]:
+        separator = raw[len(text):]
+        text = text.strip()
+
+        discarded, self._discarded = self._discarded, None
+        replacement = split_correction(text)
+        if replacement is not None:
+            corrected = self.clauses.pop() if self._open else None
+            self._open = False
+            if not replacement:
+                # "go forward 5 feet, sorry, 2 feet": the next clause may still give the new amount
+                self._discarded = corrected
+                return []
+            if self._restore(corrected, replacement, text):
+                return []
+            text, raw = replacement, replacement + separator
+        elif self._open and parse_amount(text) is not None:
+            self.clauses[-1].extend(text, raw)
+            return []
+        elif discarded is not None and self._restore(discarded, text, text):
+            return []
+
+        confirmed = self._close()
+        self.clauses.append(Clause(len(self.clauses), text, raw))
+        self._open = True
+        return confirmed
+
+    def _restore(self, corrected: Optional[Clause], amount_text: str, text: str) -> bool:
+        """
+        Reopen a corrected motion with the amount of `amount_text`, as in "move forward 5 feet, actually 3 feet".
+
+        Returns:
+            bool: Whether `amount_text` was a bare amount that fits the motion
+        """
+        amount = parse_amount(amount_text)
+        if corrected is None or corrected.response is None or amount is None:
+            return False
+        response = adjust_motion(corrected.response, amount, replace=True)
+        if response is None:
+            return False
+        corrected.response = response
+        corrected.text = f"{corrected.text}, {text}"
+        self.clauses.append(corrected)
+        self._open = True
+        return True
+
+    def _close(self) -> List[Clause]:
+        """Close the open clause, returning it if it is a motion confirmed by closing."""
+        if not self._open:
+            return []
+        self._open = False
+        clause = self.clauses[-1]
+        return [clause] if clause.response is not None else []
+
+    def confirmed(self) -> List[Clause]:
+        """Clauses answered locally, excluding an open one that a later clause may still change."""
+        closed = self.clauses[:-1] if self._open else self.clauses
+        return [clause for clause in closed if clause.response is not None]
+
+    def pending(self) -> List[Clause]:
+        """Clauses that need the crew."""
+        return [clause for clause in self.clauses if clause.response is None]
+
+    def pending_runs(self) -> List[List[Clause]]:
+        """Pending clauses grouped into runs of adjacent clauses, e.g. "rock" and "roll"."""
+        runs: List[List[Clause]] = []
+        for clause in self.pending():
+            if runs and runs[-1][-1].index == clause.index - 1:
+                runs[-1].append(clause)
+            else:
+                runs.append([clause])
+        return runs
+
+    def pending_command(self) -> str:
+        """
+        Crew input made of the pending clauses.
+
+        Separators inside a run of adjacent clauses are kept ("rock and roll"); trailing conjunctions
+        and punctuation are dropped and separate runs are joined with commas.
+        """
+        return ', '.join(
+            (''.join(clause.raw for clause in run[:-1]) + run[-1].text).strip()
+            for run in self.pending_runs()
+        )
+
+    def merge(self, crew_responses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Merge the crew's responses for the pending clauses with the confirmed ones in spoken order.
+
+        When the crew returns one response per run of pending clauses, each response takes the place
+        of its run; otherwise all of them are kept together at the position of the first pending clause.
+        """
+        runs = self.pending_runs()
+        if len(crew_responses) == len(runs):
+            placed = {run[0].index: [response] for run, response in zip(runs, crew_responses)}
+        else:
+            placed = {runs[0][0].index: list(crew_responses)} if runs else {}
+
+        merged: List[Dict[str, Any]] = []
+        for clause in self.clauses:
+            merged.extend(placed.get(clause.index, []))
+            if clause.response is not None:
+                merged.append(clause.response)
+        if not runs:
+            merged.extend(crew_responses)
+        return merged
+
+    def local_result(self) -> Dict[str, Any]:
+        """Final result when every clause was confirmed locally and the crew is not needed."""
+        return {
+            'responses': [clause.response for clause in self.clauses],
+            'validation': {
+                'status': 'PASS' if self.clauses else 'FAIL',
+                'missing_commands': None,
+                'validation_details': {'confirmed_clauses': len(self.clauses), 'crew_clauses': 0}
+            }
+        }
@@ -0,0 +1,501 @@
+"""
+Load generator for the LLM Bot WebSocket and ZMQ servers.
+Drives a server with a weighted command mix in open-loop (fixed arrival rate) or closed-loop
+(N concurrent clients) mode and reports throughput, latency percentiles, error rate and the
+server's memory over time. With --spawn the server is started against the offline fake LLM.
+"""
+import argparse
+import base64
+import functools
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm_bot.memory import read_rss_mb
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Working directory of each spawned server by pid, removed by stop_server
+_server_dirs: Dict[int, str] = {}
+
+DEFAULT_MIX = [
+    ("Move forward 5 feet and rotate clockwise 90 degrees", 4),
+    ("Move backward 30 centimeters", 2),
+    ("Rotate counterclockwise 1.5 radians and tell me what you see", 2),
+    ("Tell me what you see, then describe the left side", 1),
+    ("What's the weather like today?", 1),
+]
+
+class CommandMix:
+    """
+    Weighted, seeded source of request payloads.
+
+    Attributes:
+        commands (List[Tuple[str, float]]): (user_command, weight) pairs
+        image_ratio (float): Fraction of requests that carry an image
+        image_kb (int): Size of attached images before base64 encoding
+    """
+
+    def __init__(self, commands: List[Tuple[str, float]], image_ratio: float = 0.0,
+                 image_kb: int = 64, seed: int = 0):
+        self.commands = [command for command, _ in commands]
+        self.weights = [weight for _, weight in commands]
+        self.image_ratio = image_ratio
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # A single pre-encoded frame keeps payload generation off the measured path
+        self._image = base64.b64encode(random.Random(seed).randbytes(image_kb * 1024)).decode('ascii')
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs: Any) -> 'CommandMix':
+        """Load a mix from a JSON file of [{"user_command": ..., "weight": ...}, ...]."""
+        with open(path, 'r') as mix_file:
+            entries = json.load(mix_file)
+        return cls([(entry['user_command'], float(entry.get('weight', 1))) for entry in entries], **kwargs)
+
+    def next_request(self) -> Dict[str, Any]:
+        """Draw the next request payload."""
+        with self._lock:
+            command = self._rng.choices(self.commands, weights=self.weights)[0]
+            with_image = self._rng.random() < self.image_ratio
+        request = {'user_command': command}
+        if with_image:
+            request['image'] = self._image
+        return request
+
+class ZmqTransport:
+    """REQ socket client for app_zmq.py; one instance per worker thread."""
+
+    def __init__(self, url: str, timeout_ms: int):
+        import zmq
+        self._zmq = zmq
+        self.context = zmq.Context.instance()
+        self.url = url
+        self.timeout_ms = timeout_ms
+        self.socket = self._connect()
+
+    def _connect(self):
+        sock = self.context.socket(self._zmq.REQ)
+        sock.setsockopt(self._zmq.RCVTIMEO, self.timeout_ms)
+        sock.setsockopt(self._zmq.LINGER, 0)
+        sock.connect(self.url)
+        return sock
+
+    def send(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            self.socket.send_json(request)
+            return self.socket.recv_json()
+        except self._zmq.Again:
+            # A REQ socket cannot be reused after a missed reply
+            self.socket.close()
+            self.socket = self._connect()
+            raise TimeoutError("No reply before the client timeout")
+
+    def close(self) -> None:
+        self.socket.close()
+
+class WebSocketTransport:
+    """Synchronous WebSocket client for app.py; one connection per worker thread."""
+
+    def __init__(self, url: str, timeout_ms: int):
+        from websockets.sync.client import connect
+        self.timeout = timeout_ms / 1000.0
+        self.connection = connect(url, max_size=None, open_timeout=self.timeout)
+
+    def send(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self.connection.send(json.dumps(request))
+        return json.loads(self.connection.recv(timeout=self.timeout))
+
+    def close(self) -> None:
+        self.connection.close()
+
+def make_transport(kind: str, url: str, timeout_ms: int):
+    """Create a transport for 'zmq' or 'ws'."""
+    if kind == 'zmq':
+        return ZmqTransport(url, timeout_ms)
+    if kind == 'ws':
+        return WebSocketTransport(url, timeout_ms)
+    raise ValueError(f"Unknown transport: {kind!r}")
+
+class MemorySampler(threading.Thread):
+    """Sample a process's RSS at a fixed interval until stopped."""
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        super().__init__(name='rss-sampler', daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Tuple[float, float]] = []
+        self._stop_event = threading.Event()
+        self._t0 = time.monotonic()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            rss = read_rss_mb(self.pid)
+            if rss is not None:
+                self.samples.append((round(time.monotonic() - self._t0, 2), round(rss, 1)))
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+class Recorder:
+    """Thread-safe collection of per-request outcomes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies_ms: List[float] = []
+        self.errors: Dict[str, int] = {}
+
+    def add(self, latency_ms: float, error: Optional[str]) -> None:
+        with self._lock:
+            self.latencies_ms.append(latency_ms)
+            if error:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+def _send_one(transport, request: Dict[str, Any]) -> Optional[str]:
+    try:
+        response = transport.send(request)
+    except Exception as e:
+        return type(e).__name__
+    status = response.get('status')
+    return None if status == 'success' else f"status:{status}"
+
+def run_closed_loop(kind: str, url: str, mix: CommandMix, clients: int, duration: float,
+                    timeout_ms: int, recorder: Recorder, max_requests: Optional[int] = None) -> None:
+    """N clients each send their next request as soon as the previous reply arrives."""
+    stop_at = time.monotonic() + duration
+    remaining = [max_requests]
+    remaining_lock = threading.Lock()
+
+    def claim() -> bool:
+        if time.monotonic() >= stop_at:
+            return False
+        with remaining_lock:
+            if remaining[0] is None:
+                return True
+            remaining[0] -= 1
+            return remaining[0] >= 0
+
+    def client() -> None:
+        try:
+            transport = make_transport(kind, url, timeout_ms)
+        except Exception as e:
+            # Count a client that never connected instead of silently losing its share of the load
+            recorder.add(0.0, type(e).__name__)
+            return
+        try:
+            while claim():
+                started = time.monotonic()
+                error = _send_one(transport, mix.next_request())
+                recorder.add((time.monotonic() - started) * 1000.0, error)
+        finally:
+            transport.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def run_open_loop(kind: str, url: str, mix: CommandMix, rate: float, duration: float,
+                  timeout_ms: int, max_in_flight: int, recorder: Recorder) -> None:
+    """
+    Send requests at a fixed arrival rate regardless of how fast replies come back.
+
+    Latency is measured from each request's scheduled arrival, so queueing behind a
+    saturated server is included rather than hidden.
+    """
+    local = threading.local()
+    transports = []
+    transports_lock = threading.Lock()
+
+    def worker(scheduled: float, request: Dict[str, Any]) -> None:
+        if not hasattr(local, 'transport'):
+            local.transport = make_transport(kind, url, timeout_ms)
+            with transports_lock:
+                transports.append(local.transport)
+        error = _send_one(local.transport, request)
+        recorder.add((time.monotonic() - scheduled) * 1000.0, error)
+
+    def record_failure(scheduled: float, future) -> None:
+        # A worker that raised (e.g. its connection was refused) never reached the recorder
+        error = future.exception()
+        if error is not None:
+            recorder.add((time.monotonic() - scheduled) * 1000.0, type(error).__name__)
+
+    interval = 1.0 / rate
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        arrival = 0
+        while True:
+            scheduled = started + arrival * interval
+            if scheduled - started >= duration:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            future = pool.submit(worker, scheduled, mix.next_request())
+            future.add_done_callback(functools.partial(record_failure, scheduled))
+            arrival += 1
+    for transport in transports:
+        transport.close()
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, math.ceil(pct / 100.0 * len(values)) - 1))
+    return values[index]
+
+def summarize(recorder: Recorder, elapsed: float, memory: List[Tuple[float, float]]) -> Dict[str, Any]:
+    """Build the report dictionary."""
+    latencies = sorted(recorder.latencies_ms)
+    total = len(latencies)
+    failed = sum(recorder.errors.values())
+    return {
+        'requests': total,
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round((total - failed) / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(failed / total, 4) if total else 0.0,
+        'errors': recorder.errors,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 1),
+            'p95': round(percentile(latencies, 95), 1),
+            'p99': round(percentile(latencies, 99), 1),
+            'max': round(latencies[-1], 1) if latencies else 0.0
+        },
+        'server_rss_mb': memory
+    }
+
+def format_summary(report: Dict[str, Any]) -> str:
+    """Render a report as text."""
+    latency = report['latency_ms']
+    lines = [
+        f"requests     {report['requests']} in {report['elapsed_s']}s",
+        f"throughput   {report['throughput_rps']} req/s",
+        f"error rate   {report['error_rate'] * 100:.2f}% {report['errors'] or ''}",
+        f"latency ms   p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}",
+    ]
+    memory = report['server_rss_mb']
+    if memory:
+        peak = max(rss for _, rss in memory)
+        lines.append(f"server rss   start {memory[0][1]}MB  peak {peak}MB  end {memory[-1][1]}MB")
+        lines.append("rss over time " + " ".join(f"{t}s:{rss}" for t, rss in memory))
+    return "\n".join(lines)
+
+def rss_growth(samples: List[Tuple[float, float]], warmup: float = 0.2,
+               window: float = 0.1) -> Dict[str, Any]:
+    """
+    Compare server RSS just after warm-up with RSS at the end of a run.
+
+    Args:
+        samples: (seconds, rss_mb) pairs from MemorySampler
+        warmup (float): Leading fraction of samples ignored while caches and pools fill
+        window (float): Fraction of the remaining samples averaged at each end
+
+    Returns:
+        Dict[str, Any]: Baseline, final and growth in MB, None if there are too few samples
+    """
+    steady = samples[int(len(samples) * warmup):]
+    if len(steady) < 2:
+        return {'baseline_mb': None, 'final_mb': None, 'growth_mb': None}
+    size = max(1, int(len(steady) * window))
+    baseline = sum(rss for _, rss in steady[:size]) / size
+    final = sum(rss for _, rss in steady[-size:]) / size
+    return {'baseline_mb': round(baseline, 1), 'final_mb': round(final, 1), 'growth_mb': round(final - baseline, 1)}
+
+def _wait_for_port(port: int, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"Server did not open port {port} within {timeout:.0f}s")
+
+def spawn_server(kind: str, fake_latency_ms: float,
+                 extra_env: Optional[Dict[str, str]] = None) -> Tuple[subprocess.Popen, str]:
+    """
+    Start app.py or app_zmq.py wired to the fake LLM with quiet production logging and no telemetry.
+
+    The server runs in a temporary directory, so files it writes relative to its working directory
+    (response_generation_task's `response.json`, cassettes) stay out of the repository.
+
+    Args:
+        kind (str): 'zmq' or 'ws'
+        fake_latency_ms (float): Latency of each fake LLM call
+        extra_env (Dict[str, str], optional): Additional environment for the server
+
+    Returns:
+        Tuple[Popen, str]: The server process and the URL to connect to
+    """
+    env = dict(os.environ)
+    env.update({
+        'LLM_BOT_FAKE_LLM': '1',
+        'LLM_BOT_FAKE_LLM_LATENCY_MS': str(fake_latency_ms),
+        'LLM_BOT_LOG_PROFILE': 'production',
+        # crewai's telemetry spans cannot be exported offline; their retry buffers would show up as growth
+        'OTEL_SDK_DISABLED': 'true',
+        'PYTHONPATH': os.pathsep.join([
+            os.path.join(REPO_ROOT, 'src', 'llm_bot'),
+            os.path.join(REPO_ROOT, 'src'),
+            env.get('PYTHONPATH', '')
+        ])
+    })
+    env.update(extra_env or {})
+    script, port, url = (
+        ('app_zmq.py', 5555, 'tcp://127.0.0.1:5555') if kind == 'zmq'
+        else ('app.py', 8000, 'ws://127.0.0.1:8000/ws')
+    )
+    workdir = tempfile.mkdtemp(prefix='llm_bot_server_')
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, script)], cwd=workdir, env=env)
+    _server_dirs[process.pid] = workdir
+    try:
+        _wait_for_port(port)
+    except TimeoutError:
+        stop_server(process)
+        raise
+    return process, url
+
+def stop_server(process: subprocess.Popen) -> None:
+    """Stop a server started by spawn_server and remove its working directory."""
+    process.terminate()
+    process.wait(timeout=10)
+    shutil.rmtree(_server_dirs.pop(process.pid, ''), ignore_errors=True)
+
+def main() -> None:
+    """Command line entry point (`loadtest`)."""
+    parser = argparse.ArgumentParser(description="Load test the LLM Bot servers")
+    parser.add_argument('--transport', choices=['zmq', 'ws'], default='zmq')
+    parser.add_argument('--url', help="Server URL (default: the spawned server's address)")
+    parser.add_argument('--spawn', action='store_true', help="Start the server against the fake LLM")
+    parser.add_argument('--server-pid', type=int, help="PID of an already running server, for memory sampling")
+    parser.add_argument('--mode', choices=['open', 'closed'], default='closed')
+    parser.add_argument('--clients', type=int, default=8, help="Concurrent clients (closed loop)")
+    parser.add_argument('--rate', type=float, default=5.0, help="Arrivals per second (open loop)")
+    parser.add_argument('--max-in-flight', type=int, default=64, help="Connections available to the open loop")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to generate load")
+    parser.add_argument('--timeout-ms', type=int, default=60000, help="Client-side reply timeout")
+    parser.add_argument('--mix', help="JSON command mix file")
+    parser.add_argument('--image-ratio', type=float, default=0.0, help="Fraction of requests with an image")
+    parser.add_argument('--image-kb', type=int, default=64)
+    parser.add_argument('--fake-latency-ms', type=float, default=50.0, help="Fake LLM latency for --spawn")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    mix_options = dict(image_ratio=args.image_ratio, image_kb=args.image_kb, seed=args.seed)
+    mix = CommandMix.from_file(args.mix, **mix_options) if args.mix else CommandMix(DEFAULT_MIX, **mix_options)
+
+    process = None
+    url = args.url
+    pid = args.server_pid
+    if args.spawn:
+        process, spawned_url = spawn_server(args.transport, args.fake_latency_ms)
+        url = url or spawned_url
+        pid = process.pid
+    if url is None:
+        parser.error("--url is required unless --spawn is given")
+
+    sampler = MemorySampler(pid) if pid else None
+    recorder = Recorder()
+    started = time.monotonic()
+    try:
+        if sampler:
+            sampler.start()
+        if args.mode == 'closed':
+            run_closed_loop(args.transport, url, mix, args.clients, args.duration, args.timeout_ms, recorder)
+        else:
+            run_open_loop(args.transport, url, mix, args.rate, args.duration, args.timeout_ms,
+                          args.max_in_flight, recorder)
+    finally:
+        elapsed = time.monotonic() - started
+        if sampler:
+            sampler.stop()
+        if process:
+            stop_server(process)
+
+    report = summarize(recorder, elapsed, sampler.samples if sampler else [])
+    print(format_summary(report))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+def soak() -> None:
+    """
+    Command line entry point (`soak`).
+
+    Sends thousands of requests to a server spawned against the fake LLM and exits non-zero unless
+    its RSS stays flat after warm-up. Recycling and tracemalloc sampling are turned off in the server
+    so that growth is neither hidden nor caused by the measurement.
+    """
+    parser = argparse.ArgumentParser(description="Soak test the LLM Bot servers for memory growth")
+    parser.add_argument('--transport', choices=['zmq', 'ws'], default='zmq')
+    parser.add_argument('--requests', type=int, default=3000, help="Requests to send")
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--timeout-ms', type=int, default=60000, help="Client-side reply timeout")
+    parser.add_argument('--image-ratio', type=float, default=0.3, help="Fraction of requests with an image")
+    parser.add_argument('--image-kb', type=int, default=64)
+    parser.add_argument('--fake-latency-ms', type=float, default=1.0, help="Fake LLM latency")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between RSS samples")
+    parser.add_argument('--warmup', type=float, default=0.2, help="Fraction of the run ignored as warm-up")
+    parser.add_argument('--max-growth-mb', type=float, default=20.0, help="Allowed RSS growth after warm-up")
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    mix = CommandMix(DEFAULT_MIX, image_ratio=args.image_ratio, image_kb=args.image_kb, seed=args.seed)
+    process, url = spawn_server(args.transport, args.fake_latency_ms, extra_env={
+        'LLM_BOT_RECYCLE_AFTER_REQUESTS': '0',
+        'LLM_BOT_RECYCLE_RSS_MB': '0',
+        'LLM_BOT_MEMORY_SAMPLE_RATE': '0'
+    })
+    sampler = MemorySampler(process.pid, args.interval)
+    recorder = Recorder()
+    started = time.monotonic()
+    try:
+        sampler.start()
+        run_closed_loop(args.transport, url, mix, args.clients, float('inf'), args.timeout_ms, recorder,
+                        max_requests=args.requests)
+    finally:
+        elapsed = time.monotonic() - started
+        sampler.stop()
+        stop_server(process)
+
+    report = summarize(recorder, elapsed, sampler.samples)
+    report['rss_growth'] = rss_growth(sampler.samples, warmup=args.warmup)
+    print(format_summary(report))
+
+    growth = report['rss_growth']['growth_mb']
+    failures = []
+    if growth is None:
+        failures.append("too few RSS samples; lower --interval or send more requests")
+    elif growth > args.max_growth_mb:
+        failures.append(f"RSS grew {growth}MB after warm-up (limit {args.max_growth_mb}MB)")
+    if report['error_rate'] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate'] * 100:.2f}% (limit {args.max_error_rate * 100:.2f}%)")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(dict(report, failures=failures), output_file, indent=2)
+    if failures:
+        print("soak FAILED: " + "; ".join(failures))
+        sys.exit(1)
+    print(f"soak passed: RSS growth {growth}MB after warm-up over {report['requests']} requests")
+
+if __name__ == "__main__":
+    main()
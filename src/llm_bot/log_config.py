@@ -0,0 +1,346 @@
+"""
+Logging for the LLM Bot.
+Selects a verbosity profile from runtime.yaml, tags every record with the current request ID and
+hands records to a background thread that writes them in batches, so logging never blocks a request
+on console I/O. Full prompt dumps are kept per request and only emitted for a sampled fraction of
+requests or for requests slower than a threshold.
+"""
+import atexit
+import copy
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from llm_bot.settings import get_section
+
+LOGGER_NAME = 'llm_bot'
+
+DEFAULT_PROFILES = {
+    'development': {
+        'verbose': True,
+        'level': 'DEBUG',
+        'format': 'text',
+        'prompt_sample_rate': 0.0,
+        'slow_request_ms': 0
+    },
+    'production': {
+        'verbose': False,
+        'level': 'INFO',
+        'format': 'json',
+        'prompt_sample_rate': 0.01,
+        'slow_request_ms': 10000
+    }
+}
+
+_request_id: ContextVar[Optional[str]] = ContextVar('llm_bot_request_id', default=None)
+_prompt_trace: ContextVar[Optional['PromptTrace']] = ContextVar('llm_bot_prompt_trace', default=None)
+_configured_lock = threading.Lock()
+_writer: Optional['BatchWriter'] = None
+_settings: Optional[Dict[str, Any]] = None
+
+def log_settings() -> Dict[str, Any]:
+    """
+    Resolve the active logging profile.
+
+    The profile is chosen by `logging.profile` in runtime.yaml or LLM_BOT_LOG_PROFILE, and
+    its values may be overridden under `logging.profiles.<name>`.
+
+    Returns:
+        Dict[str, Any]: Profile values plus the writer options
+    """
+    global _settings
+    if _settings is not None:
+        return _settings
+
+    config = get_section('logging')
+    profile = os.environ.get('LLM_BOT_LOG_PROFILE', config.get('profile', 'development'))
+    overrides = (config.get('profiles') or {}).get(profile, {})
+    if profile not in DEFAULT_PROFILES and not overrides:
+        raise ValueError(f"Unknown logging profile: {profile!r}")
+
+    settings = dict(DEFAULT_PROFILES.get(profile, DEFAULT_PROFILES['production']), **overrides)
+    settings.update({
+        'profile': profile,
+        'output': config.get('output', 'stderr'),
+        'batch_size': int(config.get('batch_size', 256)),
+        'flush_interval_ms': float(config.get('flush_interval_ms', 200)),
+        'queue_size': int(config.get('queue_size', 10000))
+    })
+    _settings = settings
+    return settings
+
+def verbose_output() -> bool:
+    """Whether agents and crews should print their full reasoning to stdout."""
+    return bool(log_settings()['verbose'])
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request ID to every record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', None),
+            'msg': record.getMessage()
+        }
+        payload.update(getattr(record, 'fields', None) or {})
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, separators=(',', ':'), default=str)
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format for development, with the request ID and extra fields."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, 'request_id'):
+            record.request_id = None
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + json.dumps(fields, default=str)
+        return line
+
+class DroppingQueueHandler(logging.Handler):
+    """
+    Enqueue records for the background writer without blocking the caller.
+
+    Records are dropped (and counted) when the queue is full rather than stalling a request.
+    """
+
+    def __init__(self, record_queue: queue.Queue):
+        super().__init__()
+        self.queue = record_queue
+        self.dropped = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Resolve the message and traceback here; formatting happens on the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class BatchWriter(threading.Thread):
+    """
+    Background thread that drains the log queue and writes records in batches.
+
+    Attributes:
+        batch_size (int): Maximum records per write
+        flush_interval (float): Seconds to wait for a record before checking for shutdown
+    """
+
+    _STOP = object()
+
+    def __init__(self, record_queue: queue.Queue, stream, formatter: logging.Formatter,
+                 batch_size: int = 256, flush_interval: float = 0.2):
+        super().__init__(name='llm-bot-log-writer', daemon=True)
+        self.queue = record_queue
+        self.stream = stream
+        self.formatter = formatter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+    def run(self) -> None:
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if record is self._STOP:
+                return
+
+            batch = [record]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is self._STOP:
+                    stop = True
+                    break
+                batch.append(record)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: List[logging.LogRecord]) -> None:
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception as e:
+                lines.append(f"Failed to format log record: {e}")
+        try:
+            self.stream.write('\n'.join(lines) + '\n')
+            self.stream.flush()
+        except Exception:
+            pass
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Flush pending records and stop the thread."""
+        self.queue.put(self._STOP)
+        self.join(timeout)
+
+def configure_logging() -> logging.Logger:
+    """
+    Install the queue-backed handler on the `llm_bot` logger. Safe to call more than once.
+
+    Returns:
+        logging.Logger: The configured `llm_bot` logger
+    """
+    global _writer
+    logger = logging.getLogger(LOGGER_NAME)
+    with _configured_lock:
+        if _writer is not None:
+            return logger
+
+        settings = log_settings()
+        record_queue: queue.Queue = queue.Queue(maxsize=settings['queue_size'])
+        if settings['output'] in ('stderr', 'stdout'):
+            stream = getattr(sys, settings['output'])
+        else:
+            stream = open(settings['output'], 'a', buffering=1 << 16)
+        formatter = JsonFormatter() if settings['format'] == 'json' else TextFormatter()
+
+        _writer = BatchWriter(
+            record_queue,
+            stream,
+            formatter,
+            batch_size=settings['batch_size'],
+            flush_interval=settings['flush_interval_ms'] / 1000.0
+        )
+        _writer.start()
+        atexit.register(_writer.stop)
+
+        handler = DroppingQueueHandler(record_queue)
+        handler.addFilter(RequestContextFilter())
+        logger.handlers = [handler]
+        logger.setLevel(settings['level'])
+        logger.propagate = False
+    return logger
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a child of the `llm_bot` logger, e.g. get_logger('zmq') -> llm_bot.zmq."""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+def fields(**values: Any) -> Dict[str, Any]:
+    """Build the `extra` argument for structured fields: logger.info(msg, extra=fields(k=v))."""
+    return {'fields': values}
+
+class PromptTrace:
+    """
+    Buffered LLM calls of a single request, emitted only if the request is sampled or slow.
+
+    Attributes:
+        sampled (bool): Selected by the random sample rate
+        calls (List[Dict]): Buffered prompt/response pairs
+    """
+
+    def __init__(self, sampled: bool):
+        self.sampled = sampled
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, model: Optional[str], messages: Any, response: Any, latency_ms: float) -> None:
+        with self._lock:
+            self.calls.append({
+                'model': model,
+                'messages': list(messages) if isinstance(messages, list) else messages,
+                'response': response,
+                'latency_ms': round(latency_ms, 1)
+            })
+
+@contextmanager
+def request_context(request_id: str) -> Iterator[None]:
+    """
+    Tag all log records in the enclosed block with a request ID and handle prompt sampling.
+
+    Logs the request duration on exit, followed by the full prompt dump when the request was
+    sampled or exceeded `slow_request_ms`.
+
+    Args:
+        request_id (str): ID of the request being processed
+    """
+    settings = log_settings()
+    sample_rate = float(settings.get('prompt_sample_rate') or 0)
+    slow_ms = float(settings.get('slow_request_ms') or 0)
+    sampled = sample_rate > 0 and random.random() < sample_rate
+    trace = PromptTrace(sampled) if sampled or slow_ms > 0 else None
+
+    id_token = _request_id.set(request_id)
+    trace_token = _prompt_trace.set(trace)
+    started = time.monotonic()
+    logger = get_logger('request')
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.monotonic() - started) * 1000.0
+        logger.info("Request finished", extra=fields(elapsed_ms=round(elapsed_ms, 1)))
+        if trace is not None and trace.calls:
+            slow = slow_ms > 0 and elapsed_ms >= slow_ms
+            if trace.sampled or slow:
+                get_logger('prompts').info(
+                    "Prompt dump",
+                    extra=fields(reason='slow' if slow else 'sampled', elapsed_ms=round(elapsed_ms, 1),
+                                 calls=trace.calls)
+                )
+        _prompt_trace.reset(trace_token)
+        _request_id.reset(id_token)
+
+def instrument_llm_prompts(llm: Any) -> Any:
+    """Buffer the prompts of an LLM instance into the current request's PromptTrace."""
+    if llm is None or getattr(llm, '_prompt_trace_instrumented', False):
+        return llm
+    original_call = llm.call
+
+    @functools.wraps(original_call)
+    def call(messages, *args, **kwargs):
+        trace = _prompt_trace.get()
+        if trace is None:
+            return original_call(messages, *args, **kwargs)
+        started = time.monotonic()
+        response = original_call(messages, *args, **kwargs)
+        trace.add(getattr(llm, 'model', None), messages, response, (time.monotonic() - started) * 1000.0)
+        return response
+
+    llm.call = call
+    llm._prompt_trace_instrumented = True
+    return llm
+
+def instrument_crew_prompts(crew: Any) -> Any:
+    """Instrument every agent LLM of a crew for prompt sampling when the profile enables it."""
+    settings = log_settings()
+    if not settings.get('prompt_sample_rate') and not settings.get('slow_request_ms'):
+        return crew
+    agents = list(crew.agents or [])
+    if getattr(crew, 'manager_agent', None) is not None:
+        agents.append(crew.manager_agent)
+    for member in agents:
+        instrument_llm_prompts(getattr(member, 'llm', None))
+    return crew
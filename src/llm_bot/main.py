@@ -4,14 +4,38 @@ Main entry point for the LLM Bot application.
 Handles command processing and execution with error handling and logging.
 """
 import sys
+import time
 import warnings
 import json
 
+from llm_bot.cassette import (
+    cassette_session,
+    cassette_settings,
+    get_cassette,
+    instrument_crew,
+    load_inputs,
+    load_result,
+    new_request_id,
+    record_result
+)
 from llm_bot.crew import LlmBot
+from llm_bot.deadline import Deadline, deadline_scope
+from llm_bot.fake_llm import fake_llm_enabled
+from llm_bot.loadtest import DEFAULT_MIX, percentile
+from llm_bot.log_config import configure_logging, request_context
+from llm_bot.memory import reset_crew_state
+from llm_bot.prompts import PROFILES, average_reports, format_token_report, token_ledger, tokens_exact
+from llm_bot.tools.vision_backend import batch_window_report, format_report, frame_scope, split_frame
 
 # Suppress pysbd syntax warnings
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
+def result_to_json(result):
+    """Convert a crew result into a JSON-serializable value."""
+    if hasattr(result, 'model_dump_json'):
+        return json.loads(result.model_dump_json())
+    return result.dict() if hasattr(result, 'dict') else result
+
 def run():
     """
     Run the command processing crew with enhanced error handling and logging.
@@ -29,13 +53,27 @@ def run():
         'user_command': user_command
     }
     
+    configure_logging()
     try:
         # Create crew instance with error tracking
         crew = LlmBot().crew()
         print(f"\n🤖 Processing command: {user_command}\n")
         
-        # Execute with output validation
-        result = crew.kickoff(inputs=inputs)
+        # Execute with output validation, bounded by the default request deadline
+        # Recorded to the cassette when cassette mode is "record"
+        deadline = Deadline.from_request({})
+        request_id = new_request_id({})
+        with request_context(request_id), cassette_session(request_id, inputs), deadline_scope(deadline), \
+                token_ledger() as ledger:
+            result = crew.kickoff(inputs=inputs)
+            record_result({
+                'status': 'success',
+                'result': result_to_json(result),
+                'degraded': deadline.degraded
+            })
+        if deadline.degraded:
+            print(f"\n⚠️ Degraded stages: {', '.join(deadline.degraded)}")
+        print(f"\n🧮 Prompt tokens by agent and task:\n{format_token_report(ledger.report())}")
         
         try:
             # Try to read from file first
@@ -55,10 +93,7 @@ def run():
         except Exception as file_error:
             # Fall back to the result directly
             print("\n⚠️ Could not read from file, using direct result:")
-            if hasattr(result, 'model_dump_json'):
-                result_json = json.loads(result.model_dump_json())
-            else:
-                result_json = result.dict() if hasattr(result, 'dict') else result
+            result_json = result_to_json(result)
             
             print(json.dumps(result_json, indent=2))
             
@@ -109,6 +144,164 @@ def replay():
     except Exception as e:
         raise Exception(f"An error occurred while replaying the crew: {e}")
 
+def replay_cassette():
+    """
+    Re-run requests recorded in a cassette, serving the LLM and tools from the recording.
+    
+    Replayed calls keep their recorded latency unless `cassette.replay_latency` in runtime.yaml
+    (or LLM_BOT_CASSETTE_LATENCY) is "zero".
+    
+    Args:
+        sys.argv[1]: Path to the cassette file
+        sys.argv[2:]: Request IDs to replay, all recorded requests if omitted
+    
+    Raises:
+        Exception: If an error occurs while opening the cassette
+    """
+    try:
+        settings = dict(cassette_settings(), mode='replay', path=sys.argv[1])
+        cassette = get_cassette(settings['path'])
+        request_ids = sys.argv[2:] or cassette.request_ids()
+        crew = instrument_crew(LlmBot().crew(), settings)
+    except Exception as e:
+        raise Exception(f"An error occurred while opening the cassette: {e}")
+
+    matched = 0
+    print(f"\n📼 Replaying {len(request_ids)} requests from {settings['path']}\n")
+    for request_id in request_ids:
+        recorded = load_result(cassette, request_id)
+        started = time.monotonic()
+        try:
+            inputs = load_inputs(cassette, request_id)
+            crew_inputs, image = split_frame(inputs)
+            deadline = Deadline.from_request({})
+            with cassette_session(request_id, inputs, settings), deadline_scope(deadline), frame_scope(image):
+                result_json = result_to_json(crew.kickoff(inputs=crew_inputs))
+        except Exception as e:
+            print(f"  ❌ {request_id}: {e}")
+            continue
+        elapsed_ms = (time.monotonic() - started) * 1000.0
+
+        same = recorded is not None and recorded['response'].get('result') == result_json
+        matched += int(same)
+        recorded_ms = f"{recorded['latency_ms']:.0f}ms" if recorded else "n/a"
+        print(f"  {'✅' if same else '⚠️'} {request_id}: recorded {recorded_ms}, replayed {elapsed_ms:.0f}ms")
+
+    print(f"\n📋 {matched}/{len(request_ids)} replayed results match the recording")
+
+def vision_report():
+    """
+    Compare vision throughput and latency across micro-batch windows on the local backend,
+    for requests with one vision clause and with several submitted together.
+    
+    Args:
+        sys.argv[1]: Optional number of concurrent clients (default 8)
+        sys.argv[2:]: Optional batch windows in milliseconds (default 0 1 2 5 10 20)
+    """
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    windows = [float(window) for window in sys.argv[2:]] or [0, 1, 2, 5, 10, 20]
+    for clauses in (1, 3):
+        print(f"\n📷 Vision batch windows with {clients} concurrent clients, {clauses} vision clause(s) per request:\n")
+        print(format_report(batch_window_report(windows=windows, clients=clients, clauses=clauses)))
+
+def token_report():
+    """
+    Compare prompt tokens per request across prompt profiles on the load-test command mix.
+    
+    Set LLM_BOT_FAKE_LLM=1 to measure prompt sizes offline; completion tokens then reflect the fake answer.
+    
+    Args:
+        sys.argv[1:]: Profiles to compare (default: full compact)
+    """
+    profiles = sys.argv[1:] or list(PROFILES)
+    commands = [command for command, _ in DEFAULT_MIX]
+    counting = "tiktoken" if tokens_exact() else "estimated at 4 characters per token"
+    print(f"\n🧮 Prompt tokens per request over {len(commands)} commands ({counting})")
+
+    totals = {}
+    for profile in profiles:
+        bot = LlmBot()
+        bot.profile = profile
+        crew = bot.crew()
+        reports = []
+        for user_command in commands:
+            with deadline_scope(Deadline.from_request({})), token_ledger() as ledger:
+                try:
+                    crew.kickoff(inputs={'user_command': user_command})
+                except Exception as e:
+                    print(f"  ❌ {profile}: {user_command!r}: {e}")
+            reports.append(ledger.report())
+        rows = average_reports(reports)
+        totals[profile] = sum(row['prompt_tokens'] for row in rows)
+        print(f"\n[{profile}]\n{format_token_report(rows)}")
+
+    print("\n📋 Prompt tokens per request:")
+    baseline = totals.get(profiles[0]) or 0
+    for profile, total in totals.items():
+        change = ""
+        if baseline and profile != profiles[0]:
+            change = f" ({(total - baseline) / baseline:+.0%} vs {profiles[0]})"
+        print(f"  {profile}: {total:.0f}{change}")
+
+CREW_MODES = {
+    'hierarchical': ('hierarchical', False),
+    'sequential': ('sequential', False),
+    'sequential+merged': ('sequential', True)
+}
+
+def process_report():
+    """
+    Compare LLM calls and latency per request across crew execution modes on the load-test command mix.
+    
+    Calls are split into the manager's and the task agents' so that a manager whose delegations fail
+    (task agents making no calls) is visible.
+    
+    With LLM_BOT_FAKE_LLM=1 the run is offline: the fake manager delegates every task exactly once to the
+    task's agent and latency is the fake LLM's simulated latency, so the figures only check the call
+    structure of each mode. A live LLM is needed to measure the manager's real overhead.
+    
+    Args:
+        sys.argv[1:]: Modes to compare (default: hierarchical sequential sequential+merged)
+    """
+    modes = sys.argv[1:] or list(CREW_MODES)
+    unknown = [mode for mode in modes if mode not in CREW_MODES]
+    if unknown:
+        raise ValueError(f"Unknown crew modes {unknown}; choose from {list(CREW_MODES)}")
+    commands = [command for command, _ in DEFAULT_MIX]
+    print(f"\n⏱️ LLM calls and latency per request over {len(commands)} commands\n")
+    if fake_llm_enabled():
+        print("Offline fake LLM: the manager delegates each task once and latencies are simulated.\n")
+    print(f"{'mode':<18} {'calls':>6} {'manager':>8} {'agents':>7} {'mean_ms':>9} {'p50_ms':>9} {'max_ms':>9} "
+          f"{'errors':>6}")
+
+    for mode in modes:
+        bot = LlmBot()
+        bot.crew_process, bot.merge_parsing = CREW_MODES[mode]
+        crew = bot.crew()
+        calls, manager_calls, latencies, errors = [], [], [], 0
+        for user_command in commands:
+            started = time.monotonic()
+            with deadline_scope(Deadline.from_request({})), token_ledger() as ledger:
+                try:
+                    crew.kickoff(inputs={'user_command': user_command})
+                except Exception as e:
+                    errors += 1
+                    print(f"  ❌ {mode}: {user_command!r}: {e}")
+                finally:
+                    # As in the servers, so no delegation is answered from the previous request's tool cache
+                    reset_crew_state(crew)
+            latencies.append((time.monotonic() - started) * 1000.0)
+            calls.append(ledger.totals()['calls'])
+            manager_calls.append(sum(row['calls'] for row in ledger.report() if row['agent'] == 'manager_agent'))
+
+        latencies.sort()
+        mean_calls, mean_manager = sum(calls) / len(calls), sum(manager_calls) / len(manager_calls)
+        print(
+            f"{mode:<18} {mean_calls:>6.1f} {mean_manager:>8.1f} {mean_calls - mean_manager:>7.1f} "
+            f"{sum(latencies) / len(latencies):>9.0f} {percentile(latencies, 50):>9.0f} {latencies[-1]:>9.0f} "
+            f"{errors:>6}"
+        )
+
 def test():
     """
     Test the crew execution and return results.
@@ -0,0 +1,336 @@
+"""
+Memory bounds for the LLM Bot servers.
+Samples per-request allocations with tracemalloc, clears the per-request state crewai keeps on a
+reused crew, and recycles a worker process after a number of requests or once its RSS passes a
+threshold, with a small supervisor that starts the replacement.
+"""
+import gc
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from llm_bot.log_config import fields, get_logger
+from llm_bot.settings import get_section
+
+# Exit status a worker uses to ask the supervisor for a replacement
+RECYCLE_EXIT_CODE = 75
+
+SUPERVISED_ENV = 'LLM_BOT_SUPERVISED'
+
+logger = get_logger('memory')
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_recycler: Optional['WorkerRecycler'] = None
+
+def memory_settings() -> Dict[str, Any]:
+    """
+    Resolve the `memory` section of runtime.yaml.
+
+    LLM_BOT_MEMORY_SAMPLE_RATE, LLM_BOT_RECYCLE_AFTER_REQUESTS, LLM_BOT_RECYCLE_RSS_MB and
+    LLM_BOT_CREW_POOL_SIZE override `sample_rate`, `recycle_after_requests`, `recycle_rss_mb` and
+    `crew_pool_size`.
+    """
+    config = get_section('memory')
+    return {
+        'crew_pool_size': int(os.environ.get('LLM_BOT_CREW_POOL_SIZE', config.get('crew_pool_size', 4))),
+        'sample_rate': float(os.environ.get('LLM_BOT_MEMORY_SAMPLE_RATE', config.get('sample_rate', 0))),
+        'trace_frames': int(config.get('trace_frames', 1)),
+        'top_allocations': int(config.get('top_allocations', 5)),
+        'recycle_after_requests': int(os.environ.get('LLM_BOT_RECYCLE_AFTER_REQUESTS',
+                                                     config.get('recycle_after_requests', 0))),
+        'recycle_rss_mb': float(os.environ.get('LLM_BOT_RECYCLE_RSS_MB', config.get('recycle_rss_mb', 0)))
+    }
+
+def read_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Resident set size of a process (this one by default) in MB, from /proc or ps."""
+    pid = pid or os.getpid()
+    try:
+        with open(f"/proc/{pid}/status", 'r') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        output = subprocess.run(['ps', '-o', 'rss=', '-p', str(pid)], capture_output=True, text=True)
+        return int(output.stdout.strip()) / 1024.0
+    except (OSError, ValueError):
+        return None
+
+class MemoryStats:
+    """
+    Process-wide counters of per-request memory accounting.
+
+    Attributes:
+        requests (int): Requests that finished
+        sampled (int): Requests traced with tracemalloc
+        peak_kb_max (float): Largest traced peak of a single request
+        retained_kb_total (float): Memory still allocated after traced requests finished
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.sampled = 0
+        self.peak_kb_max = 0.0
+        self.retained_kb_total = 0.0
+        self.last: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def record(self, report: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.requests += 1
+            if report is None:
+                return
+            self.sampled += 1
+            self.peak_kb_max = max(self.peak_kb_max, report['peak_kb'])
+            self.retained_kb_total += report['retained_kb']
+            self.last = report
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'sampled': self.sampled,
+                'peak_kb_max': round(self.peak_kb_max, 1),
+                'retained_kb_total': round(self.retained_kb_total, 1),
+                'rss_mb': read_rss_mb(),
+                'last_sample': self.last
+            }
+
+memory_stats = MemoryStats()
+
+def _start_tracing(frames: int) -> None:
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        _tracing_users += 1
+
+def _stop_tracing() -> None:
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0:
+            tracemalloc.stop()
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+@contextmanager
+def memory_accounting() -> Iterator[None]:
+    """
+    Measure the enclosed request with tracemalloc when it is selected by `memory.sample_rate`.
+
+    Logs the request's peak traced allocation, the memory and object count it left behind after a
+    full collection, and the lines holding most of that memory. tracemalloc is only active while a
+    sampled request runs; concurrent requests share the process-wide tracer, so their figures overlap.
+    """
+    settings = memory_settings()
+    sample_rate = settings['sample_rate']
+    if not (sample_rate > 0 and random.random() < sample_rate):
+        try:
+            yield
+        finally:
+            memory_stats.record(None)
+        return
+
+    _start_tracing(settings['trace_frames'])
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    before = _snapshot()
+    current_before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        after = _snapshot()
+        objects_after = len(gc.get_objects())
+        _stop_tracing()
+
+        grown = [stat for stat in after.compare_to(before, 'lineno') if stat.size_diff > 0]
+        report = {
+            'peak_kb': round(max(peak - current_before, 0) / 1024.0, 1),
+            'retained_kb': round(sum(stat.size_diff for stat in grown) / 1024.0, 1),
+            'retained_objects': objects_after - objects_before,
+            'top_retained': [
+                f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} +{stat.size_diff / 1024.0:.1f}KB"
+                for stat in grown[:settings['top_allocations']]
+            ],
+            'rss_mb': read_rss_mb()
+        }
+        memory_stats.record(report)
+        logger.info("Request memory", extra=fields(**report))
+
+def reset_crew_state(crew: Any) -> None:
+    """
+    Drop the per-request state crewai keeps on a crew that is reused across requests.
+
+    Clears task outputs and retry counters, agents' tool results, retry counts and tool caches,
+    so nothing from one request is held, or answered from, during the next.
+    """
+    agents = list(crew.agents or [])
+    if getattr(crew, 'manager_agent', None) is not None:
+        agents.append(crew.manager_agent)
+    for member in agents:
+        member.tools_results = []
+        member._times_executed = 0
+        cache = getattr(member, 'cache_handler', None)
+        if cache is not None and hasattr(cache, '_cache'):
+            cache._cache.clear()
+    for crew_task in crew.tasks or []:
+        crew_task.output = None
+        crew_task.retry_count = 0
+        crew_task.used_tools = 0
+        crew_task.tools_errors = 0
+        crew_task.delegations = 0
+        crew_task.processed_by_agents = set()
+
+class CrewPool:
+    """
+    Bounded pool of crews reused across requests.
+
+    A request checks a crew out for its duration, so up to `size` requests run concurrently while the
+    number of crews, and the memory they hold, stays bounded. Crews are built on first use and reset
+    with reset_crew_state when they are returned.
+
+    Attributes:
+        size (int): Maximum number of crews, and of requests running at once
+        created (int): Crews built so far
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int):
+        """
+        Args:
+            factory (Callable): Builds a new crew
+            size (int): Maximum number of crews, at least 1
+        """
+        self.size = max(1, size)
+        self.created = 0
+        self._factory = factory
+        self._idle: List[Any] = []
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(self.size)
+
+    @contextmanager
+    def crew(self) -> Iterator[Any]:
+        """Check out a crew, waiting while all of them are in use, and return it reset."""
+        with self._slots:
+            with self._lock:
+                crew = self._idle.pop() if self._idle else None
+            if crew is None:
+                crew = self._factory()
+                with self._lock:
+                    self.created += 1
+                logger.info("Created crew", extra=fields(created=self.created, pool_size=self.size))
+            try:
+                yield crew
+            finally:
+                # Drop this request's outputs, tool results and caches before the next request gets the crew
+                reset_crew_state(crew)
+                with self._lock:
+                    self._idle.append(crew)
+
+class WorkerRecycler:
+    """
+    Decides when a worker process should be replaced.
+
+    Attributes:
+        max_requests (int): Requests after which to recycle, 0 to disable
+        max_rss_mb (float): RSS above which to recycle, 0 to disable
+        served (int): Requests finished by this worker
+        reason (str, optional): Why recycling was requested, None until then
+    """
+
+    def __init__(self, max_requests: int = 0, max_rss_mb: float = 0.0):
+        self.max_requests = max_requests
+        self.max_rss_mb = max_rss_mb
+        self.served = 0
+        self.reason: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_requests > 0 or self.max_rss_mb > 0
+
+    def request_finished(self) -> Optional[str]:
+        """
+        Count a finished request.
+
+        Returns:
+            Optional[str]: The recycle reason the first time a limit is reached, otherwise None
+        """
+        with self._lock:
+            self.served += 1
+            if self.reason is not None or not self.enabled:
+                return None
+            if self.max_requests and self.served >= self.max_requests:
+                self.reason = f"served {self.served} requests"
+            elif self.max_rss_mb:
+                rss = read_rss_mb()
+                if rss is not None and rss >= self.max_rss_mb:
+                    self.reason = f"rss {rss:.0f}MB >= {self.max_rss_mb:.0f}MB"
+            if self.reason is not None:
+                logger.warning("Recycling worker", extra=fields(reason=self.reason, served=self.served))
+            return self.reason
+
+def get_recycler() -> WorkerRecycler:
+    """Return the process-wide recycler configured by the `memory` section of runtime.yaml."""
+    global _recycler
+    if _recycler is None:
+        settings = memory_settings()
+        _recycler = WorkerRecycler(settings['recycle_after_requests'], settings['recycle_rss_mb'])
+    return _recycler
+
+def should_supervise() -> bool:
+    """Whether a server started from the command line should run under the recycling supervisor."""
+    return get_recycler().enabled and SUPERVISED_ENV not in os.environ
+
+def supervise(argv: List[str]) -> int:
+    """
+    Run a worker process and start a fresh one each time it exits to be recycled.
+
+    SIGINT and SIGTERM are forwarded to the worker and end supervision.
+
+    Args:
+        argv (List[str]): Script and arguments of the worker, run with the current interpreter
+
+    Returns:
+        int: The worker's exit status once it exits for any other reason, 128 + N if killed by signal N
+    """
+    env = dict(os.environ, **{SUPERVISED_ENV: '1'})
+    stopping = False
+    worker: Optional[subprocess.Popen] = None
+
+    def forward(signum, frame):
+        nonlocal stopping
+        stopping = True
+        if worker is not None and worker.poll() is None:
+            worker.send_signal(signum)
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+    generation = 0
+    code = 0
+    while not stopping:
+        generation += 1
+        worker = subprocess.Popen([sys.executable] + argv, env=env)
+        if stopping:
+            # The signal arrived between workers, before there was one to forward it to
+            worker.terminate()
+        logger.info("Started worker", extra=fields(pid=worker.pid, generation=generation))
+        code = worker.wait()
+        if code != RECYCLE_EXIT_CODE:
+            break
+        # Give the old worker's sockets a moment to be released before rebinding
+        time.sleep(0.2)
+    return 128 - code if code < 0 else code
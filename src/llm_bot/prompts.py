@@ -0,0 +1,222 @@
+"""
+Prompt profiles and prompt token accounting for the LLM Bot.
+The "full" profile uses agents.yaml and tasks.yaml as written; the "compact" profile overlays
+agents_compact.yaml and tasks_compact.yaml, which drop the persona prose and keep every static rule
+ahead of the request's input so provider prompt caching can reuse the prefix. A per-request token
+ledger counts the prompt and completion tokens of each agent/task pair.
+"""
+import functools
+import math
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import yaml
+
+from llm_bot.settings import get_section
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+PROFILES = ('full', 'compact')
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), 'config')
+
+COMPACT_CONFIG_PATHS = {
+    'agents': os.path.join(CONFIG_DIR, 'agents_compact.yaml'),
+    'tasks': os.path.join(CONFIG_DIR, 'tasks_compact.yaml')
+}
+
+_compact_configs: Dict[str, Dict[str, Any]] = {}
+_encoder: Any = None
+_encoder_lock = threading.Lock()
+_current_stage: ContextVar[Optional[str]] = ContextVar('llm_bot_prompt_stage', default=None)
+_ledger: ContextVar[Optional['TokenLedger']] = ContextVar('llm_bot_token_ledger', default=None)
+
+def prompt_profile() -> str:
+    """Active prompt profile from `prompts.profile` in runtime.yaml or LLM_BOT_PROMPT_PROFILE."""
+    profile = os.environ.get('LLM_BOT_PROMPT_PROFILE', get_section('prompts').get('profile', 'full'))
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown prompt profile: {profile!r}")
+    return profile
+
+def compact_config(kind: str) -> Dict[str, Any]:
+    """
+    Load the compact overrides for agents or tasks.
+
+    Args:
+        kind (str): "agents" or "tasks"
+
+    Returns:
+        Dict[str, Any]: Overrides keyed by agent or task name
+    """
+    if kind not in _compact_configs:
+        with open(COMPACT_CONFIG_PATHS[kind], 'r') as config_file:
+            _compact_configs[kind] = yaml.safe_load(config_file) or {}
+    return _compact_configs[kind]
+
+def profile_config(kind: str, name: str, config: Dict[str, Any], profile: str) -> Dict[str, Any]:
+    """
+    Apply a prompt profile to one agents.yaml or tasks.yaml entry.
+
+    Args:
+        kind (str): "agents" or "tasks"
+        name (str): Agent or task name
+        config (Dict): The entry as loaded by CrewBase
+        profile (str): Prompt profile to apply
+
+    Returns:
+        Dict[str, Any]: The entry, with the compact text replacing the full text when selected
+    """
+    if profile != 'compact':
+        return config
+    return dict(config, **compact_config(kind).get(name, {}))
+
+def profile_field(kind: str, name: str, field: str, default: Any, profile: str) -> Any:
+    """Return a field the crew passes explicitly, replaced by its compact text when selected."""
+    if profile != 'compact':
+        return default
+    return compact_config(kind).get(name, {}).get(field, default)
+
+def token_encoding_name() -> str:
+    """tiktoken encoding used for counting, from `prompts.token_encoding` in runtime.yaml."""
+    return get_section('prompts').get('token_encoding', 'cl100k_base')
+
+def _get_encoder() -> Any:
+    global _encoder
+    if tiktoken is None:
+        return None
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = tiktoken.get_encoding(token_encoding_name())
+        return _encoder
+
+def tokens_exact() -> bool:
+    """Whether counts come from tiktoken rather than the 4-characters-per-token estimate."""
+    return _get_encoder() is not None
+
+def count_tokens(text: str) -> int:
+    """Count tokens in a string with tiktoken, or estimate them when it is not installed."""
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder is None:
+        return math.ceil(len(text) / 4)
+    return len(encoder.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages: Any) -> int:
+    """Count the tokens of a prompt given as a string or a list of chat messages."""
+    if isinstance(messages, str):
+        return count_tokens(messages)
+    return sum(count_tokens(str(message.get('content') or '')) for message in messages or [])
+
+class TokenLedger:
+    """
+    Prompt and completion tokens of a single request, per (agent, task).
+
+    Attributes:
+        rows (OrderedDict): (agent, task) -> {'calls', 'prompt_tokens', 'completion_tokens'}
+    """
+
+    def __init__(self):
+        self.rows: 'OrderedDict[Tuple[str, str], Dict[str, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, agent: str, task: Optional[str], prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            row = self.rows.setdefault((agent, task or '-'),
+                                       {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+            row['calls'] += 1
+            row['prompt_tokens'] += prompt_tokens
+            row['completion_tokens'] += completion_tokens
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Rows of the ledger in first-seen order."""
+        with self._lock:
+            return [dict(row, agent=agent, task=task) for (agent, task), row in self.rows.items()]
+
+    def totals(self) -> Dict[str, int]:
+        """Calls and tokens summed over every agent/task pair."""
+        with self._lock:
+            return {
+                key: sum(row[key] for row in self.rows.values())
+                for key in ('calls', 'prompt_tokens', 'completion_tokens')
+            }
+
+@contextmanager
+def token_ledger() -> Iterator[TokenLedger]:
+    """Count the tokens of every instrumented LLM call made in the enclosed block."""
+    ledger = TokenLedger()
+    token = _ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _ledger.reset(token)
+
+@contextmanager
+def prompt_stage(task_name: Optional[str]) -> Iterator[None]:
+    """Attribute LLM calls in the enclosed block, including delegated ones, to a crew task."""
+    token = _current_stage.set(task_name)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+
+def instrument_llm_tokens(llm: Any, agent_name: str) -> Any:
+    """Count the prompt tokens of an agent's LLM into the current request's ledger."""
+    if llm is None or getattr(llm, '_token_ledger_instrumented', False):
+        return llm
+    original_call = llm.call
+
+    @functools.wraps(original_call)
+    def call(messages, *args, **kwargs):
+        ledger = _ledger.get()
+        if ledger is None:
+            return original_call(messages, *args, **kwargs)
+        response = original_call(messages, *args, **kwargs)
+        ledger.add(agent_name, _current_stage.get(), count_message_tokens(messages),
+                   count_tokens(response if isinstance(response, str) else str(response)))
+        return response
+
+    llm.call = call
+    llm._token_ledger_instrumented = True
+    return llm
+
+def average_reports(reports: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Average several per-request reports into tokens per request for each agent/task pair.
+
+    Args:
+        reports: TokenLedger.report() of each request
+
+    Returns:
+        List[Dict]: One row per agent/task pair with per-request means
+    """
+    totals: 'OrderedDict[Tuple[str, str], Dict[str, float]]' = OrderedDict()
+    for report in reports:
+        for row in report:
+            total = totals.setdefault((row['agent'], row['task']),
+                                      {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+            for key in total:
+                total[key] += row[key]
+    count = max(len(reports), 1)
+    return [
+        dict({key: round(value / count, 1) for key, value in total.items()}, agent=agent, task=task)
+        for (agent, task), total in totals.items()
+    ]
+
+def format_token_report(rows: List[Dict[str, Any]]) -> str:
+    """Render ledger rows (or averaged rows) as a fixed-width table."""
+    header = f"{'agent':<26} {'task':<26} {'calls':>6} {'prompt':>8} {'completion':>10}"
+    lines = [header]
+    for row in rows:
+        lines.append(
+            f"{row['agent']:<26} {row['task']:<26} {row['calls']:>6} "
+            f"{row['prompt_tokens']:>8} {row['completion_tokens']:>10}"
+        )
+    return "\n".join(lines)
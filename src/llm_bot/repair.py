@@ -0,0 +1,401 @@
+"""
+Deterministic repair of near-valid LLM output.
+Fixes the formatting slips agents commonly make (code fences, trailing commas, string numbers,
+intent synonyms, missing derivable fields) so the output validates without another LLM round trip.
+"""
+import ast
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+# Synonyms the agents produce for each CommandResponse.command literal
+INTENT_SYNONYMS = {
+    "MOVE_FORWARD": ["FORWARD", "FORWARDS", "MOVE_FORWARDS", "GO_FORWARD", "MOVE_AHEAD",
+                     "AHEAD", "ADVANCE", "MOVE_STRAIGHT", "STRAIGHT"],
+    "MOVE_BACKWARD": ["BACKWARD", "BACKWARDS", "MOVE_BACKWARDS", "MOVE_BACK", "BACK",
+                      "GO_BACK", "REVERSE", "MOVE_REVERSE"],
+    "ROTATE_CLOCKWISE": ["ROTATE_RIGHT", "TURN_RIGHT", "RIGHT", "CLOCKWISE", "ROTATE_CW",
+                         "CW", "TURN_CLOCKWISE"],
+    "ROTATE_COUNTERCLOCKWISE": ["ROTATE_LEFT", "TURN_LEFT", "LEFT", "COUNTERCLOCKWISE",
+                                "COUNTER_CLOCKWISE", "ROTATE_COUNTER_CLOCKWISE", "ANTICLOCKWISE",
+                                "ANTI_CLOCKWISE", "ROTATE_ANTICLOCKWISE", "ROTATE_CCW", "CCW",
+                                "TURN_COUNTERCLOCKWISE"],
+}
+NULL_INTENTS = {"", "NONE", "NULL", "VISION", "CHAT", "N/A"}
+MOVE_COMMANDS = ("MOVE_FORWARD", "MOVE_BACKWARD")
+ROTATE_COMMANDS = ("ROTATE_CLOCKWISE", "ROTATE_COUNTERCLOCKWISE")
+
+_INTENT_LOOKUP = {
+    synonym: command
+    for command, synonyms in INTENT_SYNONYMS.items()
+    for synonym in synonyms + [command]
+}
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_NUMBER_RE = re.compile(r"\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([^\d\s].*?)?\s*")
+# Units a numeric string may carry for each field; anything else is left to fail validation
+CM_UNITS = ("cm", "centimeter", "centimeters", "centimetre", "centimetres")
+DEGREE_UNITS = ("deg", "degs", "degree", "degrees", "°")
+
+class RepairStats:
+    """
+    Thread-safe counters for the repair layer.
+
+    Attributes:
+        attempts (int): Outputs that failed validation and were passed to the repair layer
+        repaired (int): Outputs that validated after repair
+        conversions_avoided (int): LLM-based output conversions skipped because a repair succeeded
+        retries_avoided (int): Repairs of output whose schema guardrail would have requested a task retry
+        fixes (Dict[str, int]): How often each kind of fix was applied
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear all counters."""
+        self.attempts = 0
+        self.repaired = 0
+        self.conversions_avoided = 0
+        self.retries_avoided = 0
+        self.fixes: Dict[str, int] = {}
+
+    def record(self, fixes: List[str], success: bool, avoids_retry: bool = False) -> None:
+        """
+        Record the outcome of one repair attempt.
+
+        Args:
+            fixes (List[str]): Fixes applied
+            success (bool): Whether the output validated after repair
+            avoids_retry (bool): Whether the task's guardrail requests a retry for invalid output,
+                rather than accepting crewai's LLM-based conversion
+        """
+        with self._lock:
+            self.attempts += 1
+            if success:
+                self.repaired += 1
+                if avoids_retry:
+                    self.retries_avoided += 1
+                else:
+                    self.conversions_avoided += 1
+            for fix in fixes:
+                self.fixes[fix] = self.fixes.get(fix, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the counters suitable for JSON output."""
+        with self._lock:
+            return {
+                'attempts': self.attempts,
+                'repaired': self.repaired,
+                'conversions_avoided': self.conversions_avoided,
+                'retries_avoided': self.retries_avoided,
+                'fixes': dict(self.fixes)
+            }
+
+repair_stats = RepairStats()
+
+def extract_json(text: str, fixes: List[str]) -> Any:
+    """
+    Extract the first JSON value from free-form LLM text.
+
+    Args:
+        text (str): Raw LLM output
+        fixes (List[str]): Collects the names of the fixes applied
+
+    Returns:
+        Any: The decoded value
+
+    Raises:
+        ValueError: If no JSON object or array can be recovered
+    """
+    candidate = text.strip()
+    fence = _FENCE_RE.search(candidate)
+    if fence:
+        candidate = fence.group(1).strip()
+        fixes.append('code_fence')
+
+    starts = [i for i in (candidate.find('{'), candidate.find('[')) if i >= 0]
+    if not starts:
+        raise ValueError("No JSON object found in output")
+    start = min(starts)
+    if start > 0:
+        fixes.append('surrounding_text')
+    candidate = candidate[start:]
+
+    decoder = json.JSONDecoder(strict=False)
+    try:
+        value, _ = decoder.raw_decode(candidate)
+        return value
+    except json.JSONDecodeError:
+        pass
+
+    cleaned = _TRAILING_COMMA_RE.sub(r"\1", candidate)
+    try:
+        value, _ = decoder.raw_decode(cleaned)
+        fixes.append('trailing_comma')
+        return value
+    except json.JSONDecodeError:
+        pass
+
+    # Python-style literals: single quotes, None/True/False
+    end = max(cleaned.rfind('}'), cleaned.rfind(']'))
+    try:
+        value = ast.literal_eval(cleaned[:end + 1])
+    except (ValueError, SyntaxError):
+        raise ValueError("Output is not recoverable JSON")
+    fixes.append('python_literal')
+    return value
+
+def normalize_intent(value: Any) -> Tuple[Optional[str], bool]:
+    """
+    Map an intent label onto a CommandResponse.command literal.
+
+    Args:
+        value (Any): Label produced by the agent
+
+    Returns:
+        Tuple[Optional[str], bool]: The canonical command (None for vision/chat) and whether it is known
+    """
+    if value is None:
+        return None, True
+    label = re.sub(r"[\s\-]+", "_", str(value).strip().upper())
+    if label in NULL_INTENTS:
+        return None, True
+    if label in _INTENT_LOOKUP:
+        return _INTENT_LOOKUP[label], True
+    return value, False
+
+def _coerce_number(value: Any, units: Tuple[str, ...] = ()) -> Any:
+    """
+    Convert a numeric string to a float.
+
+    Only a bare number, or one followed by one of `units`, is converted. Strings in any other unit
+    ("5 feet") are returned unchanged so that validation fails instead of taking the wrong amount.
+    """
+    if value is None or (isinstance(value, (int, float)) and not isinstance(value, bool)):
+        return value
+    if isinstance(value, str):
+        if value.strip().lower() in ("", "null", "none", "n/a"):
+            return None
+        match = _NUMBER_RE.fullmatch(value)
+        if match and (match.group(2) is None or match.group(2).lower().rstrip('.') in units):
+            return float(match.group(1))
+    return value
+
+def _describe(command: Optional[str], distance: Any, degree: Any, raw_output: Any) -> Optional[str]:
+    if command in MOVE_COMMANDS and isinstance(distance, (int, float)):
+        direction = "forward" if command == "MOVE_FORWARD" else "backward"
+        return f"Moving {direction} {distance:g} cm."
+    if command in ROTATE_COMMANDS and isinstance(degree, (int, float)):
+        direction = "clockwise" if command == "ROTATE_CLOCKWISE" else "counterclockwise"
+        return f"Rotating {direction} {degree:g} degrees."
+    if isinstance(raw_output, dict):
+        try:
+            return raw_output['choices'][0]['message']['content']['message']
+        except (KeyError, IndexError, TypeError):
+            pass
+        for key in ('message', 'vision', 'chat', 'response'):
+            if isinstance(raw_output.get(key), str):
+                return raw_output[key]
+    return None
+
+def _processed_by(command: Optional[str], raw_output: Any) -> str:
+    if command is not None:
+        return "command_processor_agent"
+    if isinstance(raw_output, dict) and ('choices' in raw_output or 'vision' in raw_output):
+        return "vision_agent"
+    return "chat_agent"
+
+def repair_command_response(item: Dict[str, Any], fixes: List[str]) -> Dict[str, Any]:
+    """
+    Return a repaired copy of a single CommandResponse dict.
+
+    Args:
+        item (Dict): Candidate response object
+        fixes (List[str]): Collects the names of the fixes applied
+
+    Returns:
+        Dict: Repaired object
+    """
+    item = dict(item)
+    if 'command' not in item and 'command_type' in item:
+        item['command'] = item.pop('command_type')
+        fixes.append('renamed_field')
+
+    command, known = normalize_intent(item.get('command'))
+    if command != item.get('command'):
+        fixes.append('intent_synonym')
+    item['command'] = command if known else item.get('command')
+
+    for field, units in (('linear_distance', CM_UNITS), ('rotate_degree', DEGREE_UNITS)):
+        value = _coerce_number(item.get(field), units)
+        if isinstance(item.get(field), str) and not isinstance(value, str):
+            fixes.append('numeric_string')
+        item[field] = value
+
+    # An amount in the other measurement's field is not moved over: a distance of 90 cm taken from
+    # `rotate_degree: 90` would be a guess, so such output is left to fail validation
+
+    raw_output = item.get('raw_output')
+    if isinstance(raw_output, str):
+        try:
+            parsed = json.loads(raw_output)
+        except json.JSONDecodeError:
+            parsed = None
+        item['raw_output'] = parsed if isinstance(parsed, dict) else {'output': raw_output}
+        fixes.append('raw_output_wrapped')
+    elif raw_output is not None and not isinstance(raw_output, dict):
+        item['raw_output'] = {'output': raw_output}
+        fixes.append('raw_output_wrapped')
+
+    if not isinstance(item.get('description'), str) or not item.get('description'):
+        description = _describe(command, item['linear_distance'], item['rotate_degree'], item.get('raw_output'))
+        if description:
+            item['description'] = description
+            fixes.append('default_description')
+
+    if not item.get('processed_by'):
+        item['processed_by'] = _processed_by(command, item.get('raw_output'))
+        fixes.append('default_processed_by')
+
+    return item
+
+def repair_bot_response(data: Any, fixes: List[str]) -> Any:
+    """
+    Repair a candidate BotResponseModel payload.
+
+    Args:
+        data (Any): Decoded LLM output
+        fixes (List[str]): Collects the names of the fixes applied
+
+    Returns:
+        Any: Repaired payload
+    """
+    if isinstance(data, list):
+        data = {'responses': data}
+        fixes.append('wrapped_responses')
+    if not isinstance(data, dict):
+        return data
+    data = dict(data)
+
+    if isinstance(data.get('responses'), dict):
+        data['responses'] = [data['responses']]
+        fixes.append('wrapped_responses')
+    data['responses'] = [
+        repair_command_response(item, fixes) if isinstance(item, dict) else item
+        for item in data.get('responses') or []
+    ]
+
+    # A missing validation block is not invented: the agent has to report its own status
+    validation = data.get('validation')
+    if isinstance(validation, dict) and isinstance(validation.get('status'), str) and validation['status'] not in ("PASS", "FAIL"):
+        status = validation['status'].strip().upper()
+        data['validation'] = dict(validation, status="PASS" if status in ("PASS", "PASSED", "OK", "SUCCESS") else "FAIL")
+        fixes.append('validation_status')
+    return data
+
+def repair_output(text: str, model: Type[BaseModel]) -> Tuple[Optional[BaseModel], List[str]]:
+    """
+    Repair raw LLM output so that it validates against a response model.
+
+    Supports BotResponseModel and CommandResponse (detected by their fields).
+
+    Args:
+        text (str): Raw LLM output
+        model (Type[BaseModel]): Target model
+
+    Returns:
+        Tuple[Optional[BaseModel], List[str]]: The validated instance (None if unrepairable) and the fixes applied
+    """
+    fixes: List[str] = []
+    try:
+        data = extract_json(text, fixes)
+    except ValueError:
+        return None, fixes
+
+    if 'responses' in model.model_fields:
+        data = repair_bot_response(data, fixes)
+    elif 'processed_by' in model.model_fields and isinstance(data, dict):
+        data = repair_command_response(data, fixes)
+
+    try:
+        return model.model_validate(data), fixes
+    except ValidationError:
+        return None, fixes
+
+def try_repair(text: str, model: Type[BaseModel], avoids_retry: bool = False) -> Optional[BaseModel]:
+    """
+    Repair output that failed validation and record the outcome in repair_stats.
+
+    Args:
+        text (str): Raw LLM output
+        model (Type[BaseModel]): Target model
+        avoids_retry (bool): Whether the caller would otherwise request a task retry
+
+    Returns:
+        Optional[BaseModel]: The validated instance, or None if a retry is still needed
+    """
+    try:
+        return model.model_validate_json(text)
+    except ValidationError:
+        pass
+
+    instance, fixes = repair_output(text, model)
+    repair_stats.record(fixes, instance is not None, avoids_retry)
+    return instance
+
+def schema_guardrail(model: Type[BaseModel]):
+    """
+    Build a task guardrail that requests a retry only when the output is not a valid model.
+
+    The task repairs its output before crewai converts it (see BudgetedTask._export_output), so the
+    guardrail only checks the result; repairing the same text again could not succeed.
+
+    Args:
+        model (Type[BaseModel]): Model the task output must validate against
+
+    Returns:
+        Callable: Guardrail returning (True, output) or (False, error)
+    """
+    def guardrail(task_output) -> Tuple[bool, Any]:
+        if isinstance(task_output.pydantic, model):
+            return True, task_output
+        return False, f"Output does not match the {model.__name__} schema"
+
+    return guardrail
+
+def command_list_guardrail(task_output) -> Tuple[bool, Any]:
+    """
+    Normalize the intent labels of a parsed command list.
+
+    Output that cannot be decoded is passed through unchanged so that this
+    guardrail never triggers a retry on its own.
+    """
+    fixes: List[str] = []
+    try:
+        data = extract_json(task_output.raw or "", fixes)
+    except ValueError:
+        return True, task_output
+
+    commands = data.get('responses') if isinstance(data, dict) else data
+    if not isinstance(commands, list):
+        return True, task_output
+    for item in commands:
+        if not isinstance(item, dict) or 'command_type' not in item:
+            continue
+        label = re.sub(r"[\s\-]+", "_", str(item['command_type']).strip().upper())
+        canonical = _INTENT_LOOKUP.get(label, label)
+        if canonical != item['command_type']:
+            item['command_type'] = canonical
+            fixes.append('intent_synonym')
+        for field in ('value', 'converted_value'):
+            if field in item:
+                item[field] = _coerce_number(item[field])
+
+    if not fixes:
+        return True, task_output
+    return True, json.dumps(data)
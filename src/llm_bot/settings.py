@@ -0,0 +1,52 @@
+"""
+Runtime settings for the LLM Bot.
+Loads operational defaults (deadlines and similar server-side knobs) from config/runtime.yaml.
+"""
+import os
+from typing import Any, Dict, Optional
+
+import yaml
+
+RUNTIME_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config', 'runtime.yaml')
+
+_runtime_config: Optional[Dict[str, Any]] = None
+
+def load_runtime_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load the runtime configuration.
+
+    The path can be overridden with the LLM_BOT_RUNTIME_CONFIG environment variable.
+    The default file is read once and cached for the lifetime of the process.
+
+    Args:
+        path (str, optional): Explicit path to a runtime YAML file
+
+    Returns:
+        Dict[str, Any]: Parsed configuration, empty if the file is missing
+    """
+    global _runtime_config
+    if path is None and _runtime_config is not None:
+        return _runtime_config
+
+    config_path = path or os.environ.get('LLM_BOT_RUNTIME_CONFIG', RUNTIME_CONFIG_PATH)
+    try:
+        with open(config_path, 'r') as config_file:
+            config = yaml.safe_load(config_file) or {}
+    except FileNotFoundError:
+        config = {}
+
+    if path is None:
+        _runtime_config = config
+    return config
+
+def get_section(name: str) -> Dict[str, Any]:
+    """
+    Return a single section of the runtime configuration.
+
+    Args:
+        name (str): Top-level key in runtime.yaml
+
+    Returns:
+        Dict[str, Any]: The section, or an empty dict if it is not configured
+    """
+    return load_runtime_config().get(name) or {}
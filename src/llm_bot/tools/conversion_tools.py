@@ -1,8 +1,42 @@
 from crewai.tools import BaseTool
-from typing import Type
+from typing import List, Type, Union
 from pydantic import BaseModel, Field
-import uuid
 import json
+import math
+from llm_bot.cassette import recorded_tool
+from llm_bot.deadline import current_deadline
+from llm_bot.tools.vision_backend import current_frame, get_vision_batcher
+
+# Conversion factors to the standard units, shared with the incremental clause parser
+DISTANCE_TO_CM = {
+    "feet": 30.48, "foot": 30.48, "ft": 30.48,
+    "inches": 2.54, "inch": 2.54, "in": 2.54,
+    "meters": 100, "meter": 100, "m": 100,
+    "yards": 91.44, "yard": 91.44, "yd": 91.44,
+    "centimeters": 1, "centimeter": 1, "cm": 1,
+    "millimeters": 0.1, "millimeter": 0.1, "mm": 0.1
+}
+
+ANGLE_TO_DEGREES = {
+    "radians": 180 / math.pi, "radian": 180 / math.pi, "rad": 180 / math.pi,
+    "mils": 0.05625, "mil": 0.05625,
+    "gradians": 0.9, "gradian": 0.9, "grad": 0.9,
+    "degrees": 1, "degree": 1, "deg": 1
+}
+
+def to_centimeters(value: float, unit: str) -> float:
+    """Convert a distance to centimeters, raising ValueError for unknown units."""
+    unit = unit.lower().strip()
+    if unit not in DISTANCE_TO_CM:
+        raise ValueError(f"Unsupported unit: {unit}")
+    return value * DISTANCE_TO_CM[unit]
+
+def to_degrees(value: float, unit: str) -> float:
+    """Convert an angle to degrees, raising ValueError for unknown units."""
+    unit = unit.lower().strip()
+    if unit not in ANGLE_TO_DEGREES:
+        raise ValueError(f"Unsupported unit: {unit}")
+    return value * ANGLE_TO_DEGREES[unit]
 
 class DistanceConversionInput(BaseModel):
     """Input schema for distance conversion tool."""
@@ -22,23 +56,10 @@ class DistanceConversionTool(BaseTool):
     )
     args_schema: Type[BaseModel] = DistanceConversionInput
 
+    @recorded_tool
     def _run(self, value: float, unit: str) -> float:
-        unit = unit.lower().strip()
         # Convert to cm
-        if unit in ["feet", "foot", "ft"]:
-            return value * 30.48
-        elif unit in ["inches", "inch", "in"]:
-            return value * 2.54
-        elif unit in ["meters", "meter", "m"]:
-            return value * 100
-        elif unit in ["yards", "yard", "yd"]:
-            return value * 91.44
-        elif unit in ["centimeters", "centimeter", "cm"]:
-            return value
-        elif unit in ["millimeters", "millimeter", "mm"]:
-            return value * 0.1
-        else:
-            raise ValueError(f"Unsupported unit: {unit}")
+        return to_centimeters(value, unit)
 
 class AngleConversionTool(BaseTool):
     name: str = "Angle Conversion Tool"
@@ -48,24 +69,18 @@ class AngleConversionTool(BaseTool):
     )
     args_schema: Type[BaseModel] = AngleConversionInput
 
+    @recorded_tool
     def _run(self, value: float, unit: str) -> float:
-        unit = unit.lower().strip()
         # Convert to degrees
-        if unit in ["radians", "radian", "rad"]:
-            import math
-            return value * 180 / math.pi
-        elif unit in ["mils", "mil"]:
-            return value * 0.05625
-        elif unit in ["gradians", "gradian", "grad"]:
-            return value * 0.9
-        elif unit in ["degrees", "degree", "deg"]:
-            return value
-        else:
-            raise ValueError(f"Unsupported unit: {unit}")
+        return to_degrees(value, unit)
 
 class VisionInput(BaseModel):
     """Input schema for vision tool."""
-    query: str = Field(..., description="The query about what to look for in the visual data.")
+    query: Union[str, List[str]] = Field(
+        ...,
+        description="The query about what to look for in the visual data, or a list with every vision "
+                    "query of the request so they are answered in one call."
+    )
 
 class VisionTool(BaseTool):
     name: str = "Vision Analysis Tool"
@@ -75,42 +90,20 @@ class VisionTool(BaseTool):
     )
     args_schema: Type[BaseModel] = VisionInput
 
-    def _run(self, query: str) -> str:
-        # In a real implementation, this would connect to a vision system
-        # Here we're mocking the response to match the expected format
-        
-        # Generate mock vision response
-        response = {
-            "id": str(uuid.uuid4()),
-            "choices": [{
-                "index": 0,
-                "message": {
-                    "role": "assistant",
-                    "content": {
-                        "message": "A young family is sitting in the grass with their dog.",
-                        "boundingBoxes": [{
-                            "phrase": "A young family",
-                            "substring": [0, 13],
-                            "bboxes": [[0.046875, 0.015625, 0.453125, 0.984375], 
-                                      [0.484375, 0.015625, 0.984375, 0.984375]]
-                        }, {
-                            "phrase": "their dog",
-                            "substring": [44, 52],
-                            "bboxes": [[0.390625, 0.578125, 0.640625, 0.984375]]
-                        }]
-                    },
-                    "entities": [{
-                        "phrase": "a multiplayer online game",
-                        "substring": [12, 36],
-                        "bboxes": [[0.078125, 0.046875, 0.921875, 0.234375]]
-                    }]
-                },
-                "finish_reason": "stop"
-            }]
-        }
+    @recorded_tool
+    def _run(self, query: Union[str, List[str]]) -> str:
+        # All queries of one call go into the same micro-batch, shared with concurrent
+        # requests on the configured vision backend; the frame comes from the request being processed
+        deadline = current_deadline()
+        queries = [query] if isinstance(query, str) else list(query)
+        responses = get_vision_batcher().analyze_many(
+            queries,
+            current_frame(),
+            timeout=deadline.remaining() if deadline else None
+        )
         
-        # Return the full JSON response
-        return json.dumps(response)
+        # Return the full JSON response, one per query when several were asked
+        return json.dumps(responses[0] if isinstance(query, str) else responses)
 
 class ChatInput(BaseModel):
     """Input schema for chat tool."""
@@ -123,6 +116,7 @@ class ChatTool(BaseTool):
     )
     args_schema: Type[BaseModel] = ChatInput
 
+    @recorded_tool
     def _run(self, message: str) -> str:
         # In a real implementation, this would connect to a conversational AI
         # Here we're mocking a simple response
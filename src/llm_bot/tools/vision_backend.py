@@ -0,0 +1,361 @@
+"""
+Vision backends and micro-batching for the Vision Analysis Tool.
+All vision clauses of a request are submitted together, queries from concurrent requests are collected
+for a short window, each distinct frame is decoded once, and the whole window runs as a single backend batch.
+"""
+import hashlib
+import random
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from llm_bot.settings import get_section
+
+class VisionBackend(ABC):
+    """
+    Interface for vision models used by VisionTool.
+
+    Implementations decode a frame once and answer a batch of (frame, query) pairs in one call,
+    returning one response per pair in the `choices`/`boundingBoxes` schema.
+    """
+
+    @abstractmethod
+    def decode(self, image: Optional[bytes]) -> Any:
+        """Decode raw image bytes into the backend's frame representation."""
+
+    @abstractmethod
+    def infer(self, batch: List[Tuple[Any, str]]) -> List[Dict[str, Any]]:
+        """Answer a batch of (frame, query) pairs, one response per pair in order."""
+
+class LocalVisionBackend(VisionBackend):
+    """
+    CPU stand-in for a vision-language model.
+
+    Describes a fixed scene, restricted to the side of the frame a query asks about, and
+    simulates model cost as a fixed per-batch overhead plus a per-query cost.
+
+    Attributes:
+        batch_overhead_ms (float): Simulated cost of launching one batch
+        per_query_ms (float): Simulated cost of each query in a batch
+    """
+
+    SCENE_MESSAGE = "A young family is sitting in the grass with their dog."
+    SCENE_BOXES = [{
+        "phrase": "A young family",
+        "substring": [0, 13],
+        "bboxes": [[0.046875, 0.015625, 0.453125, 0.984375],
+                   [0.484375, 0.015625, 0.984375, 0.984375]]
+    }, {
+        "phrase": "their dog",
+        "substring": [44, 52],
+        "bboxes": [[0.390625, 0.578125, 0.640625, 0.984375]]
+    }]
+    SCENE_ENTITIES = [{
+        "phrase": "a multiplayer online game",
+        "substring": [12, 36],
+        "bboxes": [[0.078125, 0.046875, 0.921875, 0.234375]]
+    }]
+
+    def __init__(self, batch_overhead_ms: float = 0.0, per_query_ms: float = 0.0):
+        self.batch_overhead_ms = batch_overhead_ms
+        self.per_query_ms = per_query_ms
+
+    def decode(self, image: Optional[bytes]) -> Dict[str, Any]:
+        if not image:
+            return {'digest': None, 'size': 0}
+        return {
+            'digest': hashlib.sha256(image).hexdigest(),
+            'size': len(image),
+            'mean': sum(image) / len(image)
+        }
+
+    def infer(self, batch: List[Tuple[Any, str]]) -> List[Dict[str, Any]]:
+        cost_ms = self.batch_overhead_ms + self.per_query_ms * len(batch)
+        if cost_ms > 0:
+            time.sleep(cost_ms / 1000.0)
+        return [self._respond(query) for _, query in batch]
+
+    def _respond(self, query: str) -> Dict[str, Any]:
+        side = _query_side(query)
+        boxes = []
+        for box in self.SCENE_BOXES:
+            kept = [bbox for bbox in box['bboxes'] if _on_side(bbox, side)]
+            if kept:
+                boxes.append(dict(box, bboxes=kept))
+        return {
+            "id": str(uuid.uuid4()),
+            "choices": [{
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": {
+                        "message": self.SCENE_MESSAGE,
+                        "boundingBoxes": boxes
+                    },
+                    "entities": self.SCENE_ENTITIES
+                },
+                "finish_reason": "stop"
+            }]
+        }
+
+def _query_side(query: str) -> Optional[str]:
+    words = query.lower()
+    if 'left' in words:
+        return 'left'
+    if 'right' in words:
+        return 'right'
+    return None
+
+def _on_side(bbox: Sequence[float], side: Optional[str]) -> bool:
+    if side is None:
+        return True
+    center = (bbox[0] + bbox[2]) / 2
+    return center < 0.5 if side == 'left' else center >= 0.5
+
+class VisionBatcher:
+    """
+    Micro-batching queue in front of a VisionBackend.
+
+    Attributes:
+        window_ms (float): How long the first query of a batch waits for others to join
+        max_batch_size (int): Upper bound on queries per backend call
+        stats (Dict[str, int]): Counters for batches, queries, decodes and frame cache hits
+    """
+
+    def __init__(self, backend: VisionBackend, window_ms: float = 5.0,
+                 max_batch_size: int = 16, frame_cache_size: int = 8):
+        self.backend = backend
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self.frame_cache_size = frame_cache_size
+        self.stats = {'batches': 0, 'queries': 0, 'decodes': 0, 'cache_hits': 0}
+        self._frames: 'OrderedDict[str, Any]' = OrderedDict()
+        self._pending: List[Tuple[Optional[bytes], str, Future]] = []
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name='vision-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, query: str, image: Optional[bytes] = None) -> Future:
+        """Queue a query against a frame and return a Future for its response."""
+        return self.submit_many([query], image)[0]
+
+    def submit_many(self, queries: Sequence[str], image: Optional[bytes] = None) -> List[Future]:
+        """Queue several queries against one frame together, so they share a batch."""
+        futures: List[Future] = [Future() for _ in queries]
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("Vision batcher is closed")
+            self._pending.extend((image, query, future) for query, future in zip(queries, futures))
+            self._condition.notify()
+        return futures
+
+    def analyze(self, query: str, image: Optional[bytes] = None,
+                timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Submit a query and wait for its response."""
+        return self.analyze_many([query], image, timeout)[0]
+
+    def analyze_many(self, queries: Sequence[str], image: Optional[bytes] = None,
+                     timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Submit every query of a request together and wait for their responses in order."""
+        futures = self.submit_many(queries, image)
+        if timeout is None:
+            return [future.result() for future in futures]
+        expires_at = time.monotonic() + timeout
+        return [future.result(max(0.0, expires_at - time.monotonic())) for future in futures]
+
+    def close(self) -> None:
+        """Stop the batching thread after the queued queries are answered."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+
+    def _loop(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and self._running:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                # Hold the window open for more queries unless the batch is already full
+                window_end = time.monotonic() + self.window_ms / 1000.0
+                while len(self._pending) < self.max_batch_size and self._running:
+                    remaining = window_end - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+            self._run_batch(batch)
+
+    def _frame(self, image: Optional[bytes]) -> Any:
+        key = hashlib.blake2b(image, digest_size=16).hexdigest() if image else ''
+        if key in self._frames:
+            self._frames.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            return self._frames[key]
+        frame = self.backend.decode(image)
+        self.stats['decodes'] += 1
+        self._frames[key] = frame
+        if len(self._frames) > self.frame_cache_size:
+            self._frames.popitem(last=False)
+        return frame
+
+    def _run_batch(self, batch: List[Tuple[Optional[bytes], str, Future]]) -> None:
+        try:
+            items = [(self._frame(image), query) for image, query, _ in batch]
+            results = self.backend.infer(items)
+            if len(results) != len(batch):
+                raise RuntimeError(f"Vision backend returned {len(results)} results for {len(batch)} queries")
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        self.stats['batches'] += 1
+        self.stats['queries'] += len(batch)
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+_current_frame: ContextVar[Optional[bytes]] = ContextVar('llm_bot_frame', default=None)
+_batcher: Optional[VisionBatcher] = None
+_batcher_lock = threading.Lock()
+
+def current_frame() -> Optional[bytes]:
+    """Return the camera frame of the request being processed, if any."""
+    return _current_frame.get()
+
+@contextmanager
+def frame_scope(image: Optional[bytes]) -> Iterator[None]:
+    """
+    Make a request's camera frame available to VisionTool.
+
+    Args:
+        image (bytes, optional): Decoded image bytes sent with the request
+    """
+    token = _current_frame.set(image)
+    try:
+        yield
+    finally:
+        _current_frame.reset(token)
+
+def split_frame(inputs: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[bytes]]:
+    """
+    Separate the image from the crew inputs.
+
+    crewai only interpolates text-like inputs, so the frame travels to VisionTool through frame_scope.
+
+    Returns:
+        Tuple[Dict, Optional[bytes]]: Crew inputs without the image, and the image
+    """
+    crew_inputs = {key: value for key, value in inputs.items() if key != 'image'}
+    return crew_inputs, inputs.get('image')
+
+def create_backend(config: Dict[str, Any]) -> VisionBackend:
+    """Instantiate the backend named by `vision.backend`."""
+    name = config.get('backend', 'local')
+    if name == 'local':
+        return LocalVisionBackend(
+            batch_overhead_ms=float(config.get('batch_overhead_ms', 0)),
+            per_query_ms=float(config.get('per_query_ms', 0))
+        )
+    raise ValueError(f"Unknown vision backend: {name!r}")
+
+def get_vision_batcher() -> VisionBatcher:
+    """Return the process-wide batcher configured by the `vision` section of runtime.yaml."""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            config = get_section('vision')
+            _batcher = VisionBatcher(
+                create_backend(config),
+                window_ms=float(config.get('batch_window_ms', 5)),
+                max_batch_size=int(config.get('max_batch_size', 16))
+            )
+        return _batcher
+
+def batch_window_report(windows: Sequence[float] = (0, 1, 2, 5, 10, 20), clients: int = 8,
+                        queries_per_client: int = 25, frames: int = 4, image_kb: int = 64,
+                        batch_overhead_ms: float = 20.0, per_query_ms: float = 2.0,
+                        clauses: int = 1, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Measure throughput and latency of the local backend for several batch windows.
+
+    Each client thread sends back-to-back requests against one of a few shared frames, each with
+    `clauses` vision queries submitted together as VisionTool does.
+
+    Args:
+        windows: Batch windows to compare, in milliseconds
+        clients (int): Concurrent client threads
+        queries_per_client (int): Queries each client sends
+        frames (int): Distinct frames shared by the clients
+        image_kb (int): Size of each synthetic frame
+        batch_overhead_ms (float): Simulated per-batch model cost
+        per_query_ms (float): Simulated per-query model cost
+        clauses (int): Vision queries per request
+        seed (int): Seed for frame and query selection
+
+    Returns:
+        List[Dict]: One row per window with query throughput, request latency percentiles and batch statistics
+    """
+    rng = random.Random(seed)
+    images = [rng.randbytes(image_kb * 1024) for _ in range(frames)]
+    queries = ["tell me what you see", "describe the left side", "what is on the right?"]
+    rows = []
+
+    for window_ms in windows:
+        batcher = VisionBatcher(LocalVisionBackend(batch_overhead_ms, per_query_ms), window_ms=window_ms)
+        latencies: List[float] = []
+        lock = threading.Lock()
+
+        def client(client_seed: int) -> None:
+            client_rng = random.Random(client_seed)
+            for _ in range(queries_per_client):
+                started = time.monotonic()
+                batcher.analyze_many([client_rng.choice(queries) for _ in range(clauses)],
+                                     client_rng.choice(images))
+                with lock:
+                    latencies.append((time.monotonic() - started) * 1000.0)
+
+        threads = [threading.Thread(target=client, args=(seed + i,)) for i in range(clients)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        batcher.close()
+
+        latencies.sort()
+        rows.append({
+            'window_ms': window_ms,
+            'throughput_qps': round(len(latencies) * clauses / elapsed, 1),
+            'p50_ms': round(_percentile(latencies, 50), 1),
+            'p95_ms': round(_percentile(latencies, 95), 1),
+            'mean_batch': round(batcher.stats['queries'] / max(batcher.stats['batches'], 1), 2),
+            'decodes': batcher.stats['decodes']
+        })
+    return rows
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(percentile / 100.0 * (len(values) - 1))))
+    return values[index]
+
+def format_report(rows: List[Dict[str, Any]]) -> str:
+    """Render batch_window_report rows as a fixed-width table."""
+    header = f"{'window_ms':>9} {'qps':>8} {'p50_ms':>8} {'p95_ms':>8} {'mean_batch':>10} {'decodes':>8}"
+    lines = [header]
+    for row in rows:
+        lines.append(
+            f"{row['window_ms']:>9} {row['throughput_qps']:>8} {row['p50_ms']:>8} "
+            f"{row['p95_ms']:>8} {row['mean_batch']:>10} {row['decodes']:>8}"
+        )
+    return "\n".join(lines)
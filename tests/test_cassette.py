@@ -0,0 +1,20 @@
+from llm_bot.cassette import Cassette
+
+def test_request_ids_with_separators_survive_a_reload(tmp_path):
+    path = str(tmp_path / 'llm_bot.cassette')
+    cassette = Cassette(path)
+    for request_id in ('plain', 'tab\tid', 'new\nline'):
+        cassette.append({'kind': 'request', 'request_id': request_id, 'inputs': {}})
+
+    reloaded = Cassette(path)
+
+    assert reloaded.request_ids() == ['plain', 'tab\tid', 'new\nline']
+    assert reloaded.load_request('new\nline') == [{'kind': 'request', 'request_id': 'new\nline', 'inputs': {}}]
+
+def test_unreadable_index_is_rebuilt_from_the_data_file(tmp_path):
+    path = str(tmp_path / 'llm_bot.cassette')
+    Cassette(path).append({'kind': 'request', 'request_id': 'a', 'inputs': {}})
+    with open(path + '.idx', 'w') as index_file:
+        index_file.write("a\t0\t10\n")
+
+    assert Cassette(path).load_request('a') == [{'kind': 'request', 'request_id': 'a', 'inputs': {}}]
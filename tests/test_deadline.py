@@ -0,0 +1,45 @@
+import json
+
+import pytest
+from crewai.tasks.task_output import TaskOutput
+
+from llm_bot.crew import BotResponseModel, LlmBot, local_bot_response, local_unit_conversion
+from llm_bot.deadline import Deadline, deadline_scope
+
+@pytest.mark.parametrize('process, budget_ms', [('sequential', 150), ('hierarchical', 300)])
+def test_short_deadline_returns_a_degraded_response(monkeypatch, process, budget_ms):
+    # Every call takes 50 ms on the fake LLM and the manager adds two calls per stage, so the
+    # budget only covers command parsing
+    monkeypatch.setenv('LLM_BOT_FAKE_LLM', '1')
+    monkeypatch.setenv('LLM_BOT_FAKE_LLM_LATENCY_MS', '50')
+    monkeypatch.setenv('LLM_BOT_CREW_PROCESS', process)
+    crew = LlmBot().crew()
+
+    deadline = Deadline(budget_ms, reserve_ms=budget_ms * 0.2)
+    with deadline_scope(deadline):
+        result = crew.kickoff(inputs={'user_command': 'move forward 5 feet and tell me what you see'})
+
+    assert isinstance(result.pydantic, BotResponseModel)
+    assert 'vision_task' in deadline.degraded
+    assert 'chat_task' in deadline.degraded
+    assert deadline.elapsed_ms() < budget_ms * 2
+
+def output(raw):
+    return TaskOutput(description='', agent='', raw=raw)
+
+def test_fallbacks_convert_locally_and_keep_every_command():
+    parsed = output(json.dumps({'responses': [
+        {'original_text': 'move forward 5 feet', 'command_type': 'MOVE_FORWARD', 'value': 5, 'unit': 'feet'},
+        {'original_text': 'turn left a bit', 'command_type': 'ROTATE_COUNTERCLOCKWISE', 'value': None, 'unit': None},
+        {'original_text': 'tell me what you see', 'command_type': 'VISION'}
+    ]}))
+
+    converted = output(local_unit_conversion([parsed]))
+    response = local_bot_response([converted, output("Vision analysis unavailable"), output("Chat processing unavailable")])
+
+    assert [item.command for item in response.responses] == ['MOVE_FORWARD', None]
+    assert response.responses[0].linear_distance == 152.4
+    assert response.responses[1].description == "Vision analysis unavailable"
+    assert response.responses[1].processed_by == 'vision_agent'
+    assert response.validation.status == 'FAIL'
+    assert response.validation.missing_commands == ['turn left a bit']
@@ -0,0 +1,66 @@
+from llm_bot.incremental import IncrementalParser
+
+def stream(utterance):
+    """Feed an utterance word by word and return the parser and every clause confirmed on the way."""
+    parser = IncrementalParser()
+    confirmed = []
+    for word in utterance.split(' '):
+        confirmed.extend(parser.feed(word + ' '))
+    confirmed.extend(parser.finish())
+    return parser, confirmed
+
+def test_correction_discards_the_previous_motion():
+    parser, confirmed = stream("turn left 90 degrees, no wait, turn right 90 degrees")
+
+    assert [clause.response['command'] for clause in confirmed] == ['ROTATE_CLOCKWISE']
+    assert confirmed[0].response['rotate_degree'] == 90.0
+    assert parser.pending() == []
+    assert parser.pending_command() == ''
+
+def test_bare_amount_extends_the_previous_motion():
+    parser, confirmed = stream("move forward 5 feet and 3 inches then tell me what you see")
+
+    assert len(confirmed) == 1
+    assert confirmed[0].response['command'] == 'MOVE_FORWARD'
+    assert confirmed[0].response['linear_distance'] == 160.02
+    assert parser.pending_command() == 'tell me what you see'
+
+def test_pending_command_drops_trailing_conjunctions():
+    parser, confirmed = stream("tell me what you see and")
+
+    assert confirmed == []
+    assert parser.pending_command() == 'tell me what you see'
+
+def test_motion_is_held_until_the_next_clause_is_complete():
+    parser = IncrementalParser()
+
+    assert parser.feed("turn left 90 degrees, ") == []
+    assert parser.feed("no wait, ") == []
+    assert parser.confirmed() == []
+
+def test_bare_correction_lets_the_next_amount_replace_the_motion_amount():
+    parser, confirmed = stream("go forward 5 feet, sorry, 2 feet and 6 inches")
+
+    assert len(confirmed) == 1
+    assert confirmed[0].response['command'] == 'MOVE_FORWARD'
+    assert confirmed[0].response['linear_distance'] == 76.2
+    assert parser.pending_command() == ''
+
+def test_motion_is_confirmed_once_the_next_clause_starts_a_new_command():
+    parser = IncrementalParser()
+
+    assert parser.feed("Move forward 5 feet and ") == []
+    confirmed = parser.feed("tell ")
+    assert [clause.response['command'] for clause in confirmed] == ['MOVE_FORWARD']
+    assert parser.feed("me what you see ") == []
+    assert parser.finish() == []
+    assert parser.pending_command() == 'tell me what you see'
+
+def test_motion_stays_open_while_the_next_clause_may_extend_it():
+    parser = IncrementalParser()
+
+    assert parser.feed("turn right 90 degrees and ") == []
+    assert parser.feed("10 ") == []
+    assert parser.feed("degrees ") == []
+    confirmed = parser.finish()
+    assert confirmed[0].response['rotate_degree'] == 100.0
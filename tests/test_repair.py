@@ -0,0 +1,51 @@
+import json
+from types import SimpleNamespace
+
+from llm_bot.crew import BotResponseModel, CommandResponse
+from llm_bot.repair import command_list_guardrail, repair_output
+
+def test_repair_output_fixes_formatting_slips():
+    text = """Here is the result:
+```json
+{"responses": [{"command": "ROTATE_RIGHT", "linear_distance": null, "rotate_degree": "90 degrees",
+                "description": "Rotating clockwise.",},],
+ "validation": {"status": "passed"}}
+```"""
+    model, fixes = repair_output(text, BotResponseModel)
+
+    assert model.responses[0].command == 'ROTATE_CLOCKWISE'
+    assert model.responses[0].rotate_degree == 90.0
+    assert model.responses[0].processed_by == 'command_processor_agent'
+    assert model.validation.status == 'PASS'
+    assert {'code_fence', 'trailing_comma', 'intent_synonym', 'numeric_string'} <= set(fixes)
+
+def test_repair_output_does_not_guess_amounts():
+    # Neither a distance in another unit nor an amount in the other measurement's field is taken over
+    in_feet = '{"command": "MOVE_FORWARD", "linear_distance": "5 feet", "description": "Moving."}'
+    in_degrees = '{"command": "MOVE_FORWARD", "rotate_degree": 90, "description": "Moving."}'
+
+    assert repair_output(in_feet, CommandResponse)[0] is None
+    assert repair_output(in_degrees, CommandResponse)[0] is None
+
+def test_repair_output_does_not_invent_validation():
+    text = json.dumps({'responses': [{'command': None, 'description': 'Hello!', 'processed_by': 'chat_agent'}]})
+
+    assert repair_output(text, BotResponseModel)[0] is None
+
+def test_command_list_guardrail_normalizes_labels_and_numbers():
+    raw = json.dumps([
+        {'original_text': 'go back 2 m', 'command_type': 'move back', 'value': '2', 'unit': 'm'},
+        {'original_text': 'what do you see', 'command_type': 'VISION'}
+    ])
+    passed, output = command_list_guardrail(SimpleNamespace(raw=raw))
+
+    assert passed
+    commands = json.loads(output)
+    assert commands[0]['command_type'] == 'MOVE_BACKWARD'
+    assert commands[0]['value'] == 2.0
+    assert commands[1]['command_type'] == 'VISION'
+
+def test_command_list_guardrail_passes_through_what_it_cannot_decode():
+    task_output = SimpleNamespace(raw='no commands here')
+
+    assert command_list_guardrail(task_output) == (True, task_output)